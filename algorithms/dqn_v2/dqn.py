@@ -1,18 +1,24 @@
 
-import random
-from collections import deque
-from typing import Any, Iterable, List, Text
+from typing import List, Text
 
 import numpy as np
 import tensorflow as tf
 from tensorflow import keras
 
+from algorithms.replay_buffer.prioritized_replay_buffer import \
+    PrioritizedReplayBuffer
+from algorithms.replay_buffer.replay_buffer import ReplayBuffer
+
 
 class DQNv2():
 
     def __init__(self, observation_size: int, action_size: int,
                  learning_rate: float, gamma: float, batch_size: int = 32,
-                 name: Text = 'DQNetwork'):
+                 name: Text = 'DQNetwork', memory_size: int = 1000000,
+                 memory: ReplayBuffer = None,
+                 prioritized_replay: bool = False,
+                 target_update_interval: int = 1000,
+                 target_update_tau: float = None):
         self.session = tf.compat.v1.Session()
         self.observation_size = observation_size
         self.action_size = action_size
@@ -21,9 +27,23 @@ class DQNv2():
         self.gamma = gamma
 
         self.hidden_layers = [128, 256, 128]
-        self.memory = deque(maxlen=200)  # type: Iterable[Any]
+        if memory is None:
+            memory = PrioritizedReplayBuffer(memory_size, observation_size) \
+                if prioritized_replay else \
+                ReplayBuffer(memory_size, observation_size)
+        self.memory = memory
+        self.prioritized_replay = isinstance(memory, PrioritizedReplayBuffer)
         self.model = self.__build_model()
 
+        # Frozen copy of the model used for bootstrap targets. Synced every
+        # target_update_interval updates, or softly after every update when
+        # target_update_tau is set
+        self.target_model = self.__build_model()
+        self.target_update_interval = target_update_interval
+        self.target_update_tau = target_update_tau
+        self.n_updates = 0
+        self.__sync_target_model()
+
     def __build_model(self):
         model = keras.Sequential()
 
@@ -43,52 +63,110 @@ class DQNv2():
 
         return model
 
-    def __memorize(
-            self, observation: List[float], action: List[float],
-            reward: float, next_observation: List[float],
-            done: bool) -> None:
-        self.memory.append(
-            (observation, action, reward, next_observation, done))
-
-    def __replay(self, batch_size: int) -> float:
-
-        def fit(o, a, r, no, done):
-            target = r
-            if not done:
-                target = (r + self.gamma * np.amax(self.model.predict(
-                    np.reshape(no, [1, self.observation_size]))[0]))
-
-            o = np.reshape(o, [1, self.observation_size])
-            target_f = self.model.predict(o)
-            target_f[0][a] = target
-            return self.model.fit(o, target_f, epochs=1, verbose=0)
+    def __sync_target_model(self) -> None:
+        self.target_model.set_weights(self.model.get_weights())
 
-        if len(self.memory) < batch_size:
-            o, a, r, no, done = self.memory[-1]
-            res = fit(o, a, r, no, done)
-            return np.average(res.history['loss'])
+    def __update_target_model(self) -> None:
+        self.n_updates += 1
 
-        mini_batch = random.sample(self.memory, batch_size)
-        histories = list()  # type: List[keras.History]
+        if self.target_update_tau is not None:
+            tau = self.target_update_tau
+            self.target_model.set_weights([
+                tau * online + (1.0 - tau) * target for online, target in
+                zip(self.model.get_weights(),
+                    self.target_model.get_weights())])
+        elif self.n_updates % self.target_update_interval == 0:
+            self.__sync_target_model()
 
-        for o, a, r, no, done in mini_batch:
-            res = fit(o, a, r, no, done)
-            histories.append(res)
+    def __memorize(
+            self, observations: np.ndarray, actions: np.ndarray,
+            rewards: np.ndarray, next_observations: np.ndarray,
+            done_flags: np.ndarray) -> None:
+        self.memory.add(observations, actions, rewards, next_observations,
+                        done_flags)
 
-        return np.average([np.average(v.history['loss']) for v in histories])
+    def __replay(self, batch_size: int) -> float:
+        indices = self.memory.sample_indices(batch_size)
+        observations, actions, rewards, next_observations, done_flags = \
+            self.memory.gather(indices)
+
+        # One forward pass for Q(s, .) over the whole batch and one through
+        # the target network for Q(s', .)
+        q_values = self.model.predict_on_batch(observations)
+        q_next = self.target_model.predict_on_batch(next_observations)
+
+        targets = rewards + (1.0 - done_flags) * self.gamma * \
+            np.amax(q_next, axis=1)
+        q_values = np.array(q_values)
+        batch_range = np.arange(len(actions))
+
+        if not self.prioritized_replay:
+            q_values[batch_range, actions] = targets
+            loss = self.model.train_on_batch(observations, q_values)
+        else:
+            # Weight the loss by importance sampling and re-prioritize by TD
+            # error
+            weights = self.memory.importance_weights(indices)
+            td_errors = targets - q_values[batch_range, actions]
+            q_values[batch_range, actions] = targets
+            loss = self.model.train_on_batch(observations, q_values,
+                                             sample_weight=weights)
+            self.memory.update_priorities(indices, td_errors)
+
+        self.__update_target_model()
+        return float(loss)
 
     def predict(self, observation: List[float]):
         predictions = self.model.predict(observation)
         return np.argmax(predictions[0])
 
-    def train(self, observations: List[List[float]],
-              observations_next: List[List[float]], actions: List[List[float]],
-              rewards: List[float], done_flags: List[float]) -> float:
-
-        self.__memorize(observations[0], actions[0],
-                        rewards[0], observations_next[0], bool(done_flags[0]))
-        avg_loss = self.__replay(self.batch_size)
-        return avg_loss
+    def q_values(self, observations: np.ndarray) -> np.ndarray:
+        """Return the (n, action_size) Q-values of a batch of observations."""
+        return np.asarray(self.model.predict_on_batch(
+            np.asarray(observations, dtype=np.float32)))
+
+    def predict_batch(self, observations: np.ndarray) -> np.ndarray:
+        """Return the greedy action index for every row of observations."""
+        return np.argmax(self.q_values(observations), axis=1)
+
+    def train(self, observations: np.ndarray, observations_next: np.ndarray,
+              actions: np.ndarray, rewards: np.ndarray,
+              done_flags: np.ndarray) -> float:
+        """
+        Store a batch of transitions and train on replayed minibatches.
+
+        One minibatch update is run per batch_size new transitions, with at
+        least one update per call.
+
+        Arguments:
+        observations -- (n, observation_size) observations
+        observations_next -- (n, observation_size) resulting observations
+        actions -- (n,) action indices
+        rewards -- (n,) rewards
+        done_flags -- (n,) 1.0 if the transition ended the episode; else 0.0
+
+        Returns:
+        Average loss over the minibatch updates
+        """
+        observations = np.asarray(observations, dtype=np.float32)
+        observations_next = np.asarray(observations_next, dtype=np.float32)
+        actions = np.asarray(actions, dtype=np.int64)
+        rewards = np.asarray(rewards, dtype=np.float32)
+        done_flags = np.asarray(done_flags, dtype=np.float32)
+
+        self.__memorize(observations, actions, rewards, observations_next,
+                        done_flags)
+
+        n_updates = max(1, len(actions) // self.batch_size)
+        losses = [self.__replay(self.batch_size) for _ in range(n_updates)]
+        return np.average(losses)
+
+    def get_weights(self) -> List[np.ndarray]:
+        return self.model.get_weights()
+
+    def set_weights(self, weights: List[np.ndarray]) -> None:
+        """Replace the online model weights, e.g. with a learner's copy."""
+        self.model.set_weights(weights)
 
     def save(self, path: Text):
         self.model.save_weights(path)
@@ -96,3 +174,4 @@ class DQNv2():
 
     def load(self, path: Text):
         self.model.load_weights(path)
+        self.__sync_target_model()
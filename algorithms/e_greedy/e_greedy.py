@@ -1,14 +1,83 @@
+from typing import Callable, Union
 
 import numpy as np
 
+SCHEDULES = ('exponential', 'linear', 'step')
+
 
 class EGreedy():
+    """
+    Epsilon-greedy exploration for a batch of agents or environments.
+
+    Exploration probabilities come from the closed form of the schedule, so
+    a decision for any number of environments is one vectorized evaluation
+    and a single random draw, and no memory is spent on long schedules.
+
+    Arguments:
+    decay_rate -- Exponential decay rate per timestep
+    explore_min -- Final exploration probability
+    explore_max -- Initial exploration probability
+    schedule -- One of 'exponential', 'linear' or 'step'
+    decay_steps -- Timesteps to reach explore_min for the linear schedule,
+        timesteps between drops for the step schedule
+    step_factor -- Multiplier applied at every drop of the step schedule
+    metrics_hook -- Called with the array of exploration probabilities used
+        for every decision
+    """
 
     def __init__(self, decay_rate: float = 0.01, explore_min: float = 0.01,
-                 explore_max: float = 1.0):
+                 explore_max: float = 1.0, schedule: str = 'exponential',
+                 decay_steps: int = 1000, step_factor: float = 0.5,
+                 metrics_hook: Callable[[np.ndarray], None] = None):
+        assert schedule in SCHEDULES, f"Schedule must be one of {SCHEDULES}"
+        assert 0.0 < step_factor < 1.0, "Step factor must be in (0, 1)"
         self.decay_rate = decay_rate
         self.explore_min = explore_min
         self.explore_max = explore_max
+        self.schedule_name = schedule
+        self.decay_steps = decay_steps
+        self.step_factor = step_factor
+        self.metrics_hook = metrics_hook
+
+    def epsilon(self, timesteps: Union[int, np.ndarray]) -> np.ndarray:
+        """Return the exploration probability at each timestep."""
+        timesteps = np.maximum(np.asarray(timesteps, dtype=np.float64), 0.0)
+        span = self.explore_max - self.explore_min
+
+        if self.schedule_name == 'exponential':
+            epsilons = self.explore_min + \
+                span * np.exp(-self.decay_rate * timesteps)
+        elif self.schedule_name == 'linear':
+            epsilons = self.explore_max - \
+                span * np.minimum(timesteps / self.decay_steps, 1.0)
+        else:
+            # Drops underflow to 0 when explore_min is 0, never overflow
+            epsilons = np.maximum(
+                self.explore_max *
+                self.step_factor ** (timesteps // self.decay_steps),
+                self.explore_min)
+        return epsilons.astype(np.float32)
+
+    def predict_batch(self, timesteps: Union[int, np.ndarray],
+                      n: int = None) -> np.ndarray:
+        """
+        Calculate if exploration should happen for a batch of decisions.
+
+        Arguments:
+        timesteps -- Current timestep per decision, or a single timestep
+            shared by all of them
+        n -- Number of decisions when timesteps is a single timestep
+
+        Returns:
+        Boolean array, True where the decision should explore
+
+        """
+        epsilons = np.broadcast_to(self.epsilon(timesteps),
+                                   (n,) if n is not None else
+                                   np.shape(timesteps))
+        if self.metrics_hook is not None:
+            self.metrics_hook(epsilons)
+        return np.random.rand(*epsilons.shape) < epsilons
 
     def predict(self, timestep: int) -> bool:
         """
@@ -21,9 +90,4 @@ class EGreedy():
         True if should explore; else false
 
         """
-        tradeoff = np.random.rand()
-        explore_prob = self.explore_min + \
-            (self.explore_max - self.explore_min) * \
-            np.exp(-self.decay_rate * float(timestep))
-        print(f'Explore prob: {explore_prob}')
-        return explore_prob > tradeoff
+        return bool(self.predict_batch(timestep, n=1)[0])
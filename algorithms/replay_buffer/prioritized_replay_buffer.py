@@ -0,0 +1,112 @@
+import numpy as np
+
+from algorithms.replay_buffer.replay_buffer import ReplayBuffer
+
+
+class SumTree():
+    """
+    Binary tree where every node holds the sum of its children.
+
+    The tree is stored in a flat array with the root at index 1 and the
+    leaves at [n_leaves, 2 * n_leaves). Updates and prefix-sum lookups work
+    on whole index arrays and walk the tree one level at a time, so a batch
+    costs O(batch_size * log(capacity)) NumPy work.
+    """
+
+    def __init__(self, capacity: int):
+        self.depth = max(1, int(np.ceil(np.log2(capacity))))
+        self.n_leaves = 1 << self.depth
+        self.nodes = np.zeros(2 * self.n_leaves, dtype=np.float64)
+
+    @property
+    def total(self) -> float:
+        return self.nodes[1]
+
+    def get(self, indices: np.ndarray) -> np.ndarray:
+        return self.nodes[self.n_leaves + indices]
+
+    def update(self, indices: np.ndarray, values: np.ndarray) -> None:
+        nodes = self.n_leaves + np.asarray(indices)
+        self.nodes[nodes] = values
+
+        for _ in range(self.depth):
+            nodes = np.unique(nodes // 2)
+            self.nodes[nodes] = self.nodes[2 * nodes] + \
+                self.nodes[2 * nodes + 1]
+
+    def find(self, values: np.ndarray) -> np.ndarray:
+        """Return the leaf index where the prefix sum reaches each value."""
+        values = np.array(values, dtype=np.float64)
+        nodes = np.ones(len(values), dtype=np.int64)
+
+        for _ in range(self.depth):
+            left = 2 * nodes
+            go_right = values > self.nodes[left]
+            values -= np.where(go_right, self.nodes[left], 0.0)
+            nodes = left + go_right
+
+        return nodes - self.n_leaves
+
+
+class PrioritizedReplayBuffer(ReplayBuffer):
+    """
+    Replay memory sampling transitions proportional to their TD error.
+
+    Implements proportional prioritization from Schaul et al., Prioritized
+    Experience Replay, 2015. New transitions get the highest priority seen so
+    far, priorities are updated in batches from the TD errors of a training
+    step and importance-sampling weights correct the bias of the sampling.
+
+    Arguments:
+    alpha -- How much prioritization is used, 0 is uniform sampling
+    beta -- Initial importance-sampling correction, annealed towards 1
+    beta_increment -- Added to beta on every sampled batch
+    epsilon -- Keeps transitions with zero TD error sampleable
+    """
+
+    def __init__(self, capacity: int, observation_size: int,
+                 alpha: float = 0.6, beta: float = 0.4,
+                 beta_increment: float = 1e-6, epsilon: float = 1e-6):
+        super().__init__(capacity, observation_size)
+        self.alpha = alpha
+        self.beta = beta
+        self.beta_increment = beta_increment
+        self.epsilon = epsilon
+        self.max_priority = 1.0
+        self.tree = SumTree(capacity)
+
+    def add(self, observations: np.ndarray, actions: np.ndarray,
+            rewards: np.ndarray, next_observations: np.ndarray,
+            done_flags: np.ndarray) -> np.ndarray:
+        indices = super().add(observations, actions, rewards,
+                              next_observations, done_flags)
+        self.tree.update(indices, np.full(len(indices), self.max_priority))
+        return indices
+
+    def sample_indices(self, batch_size: int) -> np.ndarray:
+        """Draw one index per equal slice of the total priority mass."""
+        assert self.size > 0, "Cannot sample from an empty replay buffer"
+        segment = self.tree.total / batch_size
+        values = (np.arange(batch_size) + np.random.rand(batch_size)) * \
+            segment
+        indices = self.tree.find(values)
+        # Guard against float round-off walking into unused leaves
+        return np.minimum(indices, self.size - 1)
+
+    def importance_weights(self, indices: np.ndarray) -> np.ndarray:
+        """
+        Return importance-sampling weights for sampled indices.
+
+        Weights are normalized by their maximum so they only ever scale the
+        loss down. Every call anneals beta towards 1.
+        """
+        probabilities = self.tree.get(indices) / self.tree.total
+        weights = (self.size * probabilities) ** -self.beta
+        self.beta = min(1.0, self.beta + self.beta_increment)
+        return (weights / weights.max()).astype(np.float32)
+
+    def update_priorities(self, indices: np.ndarray,
+                          td_errors: np.ndarray) -> None:
+        priorities = (np.abs(td_errors) + self.epsilon) ** self.alpha
+        self.max_priority = max(self.max_priority, priorities.max())
+        self.tree.update(indices, priorities)
@@ -0,0 +1,76 @@
+from typing import Tuple
+
+import numpy as np
+
+Batch = Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+
+
+class ReplayBuffer():
+    """
+    Fixed capacity experience replay memory backed by preallocated arrays.
+
+    Transitions are written into ring buffers, once full the oldest
+    transitions are overwritten. Sampling draws uniform indices with
+    replacement and gathers whole batches at once.
+    """
+
+    def __init__(self, capacity: int, observation_size: int):
+        self.capacity = capacity
+        self.observation_size = observation_size
+
+        self.observations = np.zeros((capacity, observation_size),
+                                     dtype=np.float32)
+        self.actions = np.zeros(capacity, dtype=np.int16)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self.next_observations = np.zeros((capacity, observation_size),
+                                          dtype=np.float32)
+        self.done_flags = np.zeros(capacity, dtype=np.float32)
+
+        self.position = 0
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def add(self, observations: np.ndarray, actions: np.ndarray,
+            rewards: np.ndarray, next_observations: np.ndarray,
+            done_flags: np.ndarray) -> np.ndarray:
+        """
+        Store a batch of transitions.
+
+        Returns:
+        The buffer indices the transitions were written to
+        """
+        n = len(actions)
+        if n > self.capacity:
+            # Only the newest transitions would survive anyway
+            observations, actions, rewards, next_observations, done_flags = [
+                column[-self.capacity:] for column in
+                (observations, actions, rewards, next_observations,
+                 done_flags)]
+            n = self.capacity
+
+        indices = (self.position + np.arange(n)) % self.capacity
+        self.observations[indices] = observations
+        self.actions[indices] = actions
+        self.rewards[indices] = rewards
+        self.next_observations[indices] = next_observations
+        self.done_flags[indices] = done_flags
+
+        self.position = (self.position + n) % self.capacity
+        self.size = min(self.size + n, self.capacity)
+        return indices
+
+    def sample_indices(self, batch_size: int) -> np.ndarray:
+        assert self.size > 0, "Cannot sample from an empty replay buffer"
+        return np.random.randint(0, self.size, size=batch_size)
+
+    def gather(self, indices: np.ndarray) -> Batch:
+        """Return (observations, actions, rewards, next, done) at indices."""
+        return (self.observations[indices], self.actions[indices],
+                self.rewards[indices], self.next_observations[indices],
+                self.done_flags[indices])
+
+    def sample(self, batch_size: int) -> Batch:
+        """Sample a uniform batch of transitions."""
+        return self.gather(self.sample_indices(batch_size))
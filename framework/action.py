@@ -1,5 +1,6 @@
 
 class Action():
+    __slots__ = ()
 
     def as_array(self):
         raise NotImplementedError("Implement as_array for your action")
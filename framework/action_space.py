@@ -31,4 +31,11 @@ class DiscreteActionSpace(ActionSpace):
         return self.actions[index]
 
     def random_action(self) -> DiscreteAction:
-        return np.random.choice(self.actions)
+        return self.actions[np.random.randint(self.n_actions)]
+
+    def random_indices(self, n: int) -> np.ndarray:
+        """Draw a batch of n uniformly random action indices."""
+        return np.random.randint(0, self.n_actions, size=n)
+
+    def random_actions(self, n: int) -> List[DiscreteAction]:
+        return [self.actions[i] for i in self.random_indices(n)]
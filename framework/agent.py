@@ -1,4 +1,6 @@
 
+from typing import List
+
 from framework.action import Action
 from framework.action_space import ActionSpace
 from framework.observation import Observation
@@ -12,6 +14,9 @@ class Agent():
     def act(self, observation: Observation) -> Action:
         raise NotImplementedError()
 
+    def act_batch(self, observations, timesteps) -> List[Action]:
+        raise NotImplementedError()
+
     def learn(self, observation: Observation, action: Action,
               reward: float) -> None:
         raise NotImplementedError()
@@ -14,3 +14,11 @@ class Device():
 
     def read_state(self):
         raise NotImplementedError("Implement read_state() function")
+
+    def fileno(self) -> int:
+        """File descriptor that becomes readable when new state is pending."""
+        raise NotImplementedError("Implement fileno() function")
+
+    def advance(self, n_frames: int):
+        """Let a device waiting for input run n_frames more frames."""
+        raise NotImplementedError("Implement advance() function")
@@ -1,7 +1,6 @@
 
 import binascii
 import configparser
-import errno
 import logging
 import os
 import pkgutil
@@ -10,7 +9,7 @@ import socket
 import subprocess
 import time
 from pathlib import Path
-from typing import Text
+from typing import NamedTuple, Text, Tuple
 
 from framework.devices.device import Device
 from framework.devices.dolphin.dolphin_pad import DolphinPad
@@ -20,17 +19,67 @@ logging.basicConfig(level=logging.DEBUG)
 log = logging.getLogger(__name__)
 
 
+class MemoryFrame(NamedTuple):
+    """
+    Value of every watched memory address after one emulator frame.
+
+    Values are stored as 4 bytes per address in the order of the addresses
+    in the MemoryWatcher Locations file.
+    """
+    addresses: Tuple[Text, ...]
+    values: bytes
+    changed: Tuple[int, ...]  # Indices of the addresses updated by this read
+
+
 class Dolphin(Device):
 
-    def __init__(self, executable_path: Path, iso_path: Path, memory_mapping: Path, render: bool = True):
+    MAX_DATAGRAM_SIZE = 9096
+
+    def __init__(self, executable_path: Path, iso_path: Path,
+                 memory_mapping: Path, render: bool = True,
+                 user_dir: Path = None, emulation_speed: float = 1.0,
+                 blocking_input: bool = False):
+        """
+        Dolphin emulator controlled through a pipe and the MemoryWatcher.
+
+        Arguments:
+        executable_path -- Path to the Dolphin binary
+        iso_path -- Path to the game ISO
+        memory_mapping -- MemoryWatcher Locations file to watch
+        render -- Use the Null renderer when False
+        user_dir -- Private Dolphin user directory, seeded from the system
+            one on first use. Gives every instance its own config, pipe and
+            MemoryWatcher socket. Defaults to the system user directory
+        emulation_speed -- Multiple of real-time speed, 0 runs unthrottled.
+            Anything but 1.0 needs blocking_input, otherwise nothing ties the
+            emulator frames to the inputs
+        blocking_input -- Enable BlockingPipes, the emulator then waits for
+            the pad to advance every frame
+        """
         super().__init__('dolphin')
-        self.dolphin_path = self.__get_dolphin_home_path()
+        if user_dir is None:
+            self.dolphin_path = self.__get_dolphin_home_path()
+        else:
+            self.dolphin_path = self.__create_user_dir(Path(user_dir))
         self.fifo_path = self.__create_fifo_pipe('pipe')
         self.memory_mapping_file = memory_mapping
+        self.addresses = tuple(
+            line.strip() for line in Path(memory_mapping).read_text()
+            .splitlines() if line.strip())
+        self.address_to_index = {
+            address.encode(): i for i, address in enumerate(self.addresses)}
+        # Position of every address in the order the MemoryWatcher sends them
+        self.address_ranks = [0] * len(self.addresses)
+        for rank, i in enumerate(sorted(range(len(self.addresses)),
+                                        key=lambda i: self.addresses[i])):
+            self.address_ranks[i] = rank
+        self.memory_values = bytearray(4 * len(self.addresses))
         self.executable_path = executable_path
         self.iso_path = iso_path
         self.render = render
-        self.pad = DolphinPad(self.fifo_path)
+        self.emulation_speed = emulation_speed
+        self.blocking_input = blocking_input
+        self.pad = DolphinPad(self.fifo_path, blocking=blocking_input)
         self.process = None
 
         # Make sure all config files exist and have correct content
@@ -62,9 +111,14 @@ class Dolphin(Device):
         config = configparser.SafeConfigParser()
         config.read(dolphin_config_path)
 
-        # Dolphin config
+        # Dolphin config, a fresh user directory starts without one
+        for section in ('Core', 'Input'):
+            if not config.has_section(section):
+                config.add_section(section)
         # config.set('Core', 'SIDevice', )
         config.set('Core', 'enablecheats', 'True')
+        config.set('Core', 'EmulationSpeed', str(self.emulation_speed))
+        config.set('Core', 'BlockingPipes', str(self.blocking_input))
         config.set('Input', 'backgroundinput', 'True')
         with open(dolphin_config_path, 'w') as dcp:
             config.write(dcp)
@@ -114,6 +168,23 @@ class Dolphin(Device):
         output_dir = pad_dir / config_file_name
         output_dir.write_text(config_text)
 
+    def __create_user_dir(self, user_dir: Path) -> Path:
+        if not user_dir.is_dir():
+            try:
+                home_path = self.__get_dolphin_home_path()
+            except DolphinNotFoundError:
+                home_path = None
+
+            # Start from the system settings, caches and saves are left out
+            for sub_dir in ('Config', 'GameSettings'):
+                if home_path is not None and (home_path / sub_dir).is_dir():
+                    shutil.copytree(str(home_path / sub_dir),
+                                    str(user_dir / sub_dir))
+
+        for sub_dir in ('Config', 'GameSettings'):
+            (user_dir / sub_dir).mkdir(parents=True, exist_ok=True)
+        return user_dir
+
     def __get_dolphin_home_path(self) -> Path:
         home_dir = Path.home()
 
@@ -161,26 +232,75 @@ class Dolphin(Device):
         # Set up controller
         self.pad.connect()
 
-    def read_state(self):
-        data = None
-        try:
-            data = self.mem_socket.recvfrom(
-                9096)[0].decode('utf-8').splitlines()
-        except socket.timeout:  # Won't happen with nonblocking
-            return None, None
-        except socket.error as e:
-            if e.errno != errno.EAGAIN:
-                raise e
+    def __parse_datagram(self, datagram: bytes) -> Tuple[int, bytes]:
+        """Return the address index and raw value of a datagram, or None."""
+        # Datagrams are '<address>\n<hex value>\n\0'
+        lines = datagram.split(b'\n')
+        if len(lines) < 2:
+            return None
+
+        index = self.address_to_index.get(lines[0])
+        if index is None:
+            log.debug(f'Ignoring unwatched address {lines[0]}')
+            return None
 
         # Strip the null terminator, pad with zeros, then convert to bytes
-        if data is not None:
-            return data[0], binascii.unhexlify(data[1].strip('\x00').zfill(8))
-        else:
-            return None, None
+        value = lines[1].strip(b'\x00').rjust(8, b'0')
+        return index, binascii.unhexlify(value)
+
+    def read_state(self) -> MemoryFrame:
+        """
+        Read the pending MemoryWatcher updates of one emulator frame.
+
+        The MemoryWatcher walks its watches in sorted address order every
+        frame and only sends the values that changed, so an address that does
+        not sort after the previous one starts the next frame. That datagram
+        is left queued for the next read. As the frame counter changes on
+        every frame, two frames are never merged into one read, even when the
+        reader falls behind: every menu state change shows up in its own
+        read. A read that overtakes the emulator mid-frame returns the part
+        sent so far, the rest follows in the next read.
+        """
+        changed = []
+        last_rank = -1
+        while True:
+            try:
+                datagram = self.mem_socket.recv(self.MAX_DATAGRAM_SIZE,
+                                                socket.MSG_PEEK)
+            except BlockingIOError:
+                break
+
+            parsed = self.__parse_datagram(datagram)
+            if parsed is not None and \
+                    self.address_ranks[parsed[0]] <= last_rank:
+                break
+
+            # Consume the datagram that was peeked at
+            self.mem_socket.recv(self.MAX_DATAGRAM_SIZE)
+            if parsed is None:
+                continue
+
+            index, value = parsed
+            self.memory_values[4 * index:4 * index + 4] = value
+            changed.append(index)
+            last_rank = self.address_ranks[index]
+
+        return MemoryFrame(self.addresses, bytes(self.memory_values),
+                           tuple(sorted(changed)))
+
+    def fileno(self) -> int:
+        return self.mem_socket.fileno()
 
     def set_button_state(self, state):
         self.pad.set_button_state(state)
 
+    @property
+    def frames_advanced(self) -> int:
+        return self.pad.frames_advanced
+
+    def advance(self, n_frames: int):
+        self.pad.advance(n_frames)
+
     def terminate(self):
         if self.process != None:
             self.process.kill()
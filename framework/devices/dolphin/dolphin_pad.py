@@ -1,6 +1,7 @@
 
 import functools
 import logging
+import threading
 import time
 
 from slippi.event import Buttons  # TODO: Move in to "dolphin"?
@@ -19,6 +20,18 @@ def bits(n):
 class DolphinPad:
     """
     Control dolphin emulator through pipes.
+
+    Commands are queued and written to the pipe in one buffered write, at
+    most once per emulator frame. A button state change therefore costs a
+    single write no matter how many buttons changed. With background=True a
+    writer thread does the writes and callers never block; otherwise a write
+    sleeps at most until the next frame boundary.
+
+    With blocking=True Dolphin runs with BlockingPipes and waits for a FLUSH
+    command on every frame. Commands then only take effect on the next FLUSH
+    and advance() lets the emulator run an exact number of frames, whatever
+    the emulation speed. Without it advance() sleeps for the same number of
+    frames at real-time speed.
     """
 
     BUTTONS_TO_CONTROLLER = {
@@ -45,14 +58,22 @@ class DolphinPad:
     ALL_CONTINUOUS_BUTTONS = functools.reduce(
         lambda x, y: x + list(y.keys()), list(CONTINUOUS_BUTTONS.values()), [])
 
-    MIN_COOLDOWN = 1.0/30.0
+    FRAME_INTERVAL = 1.0/60.0  # Minimum time between two pipe writes
+    MIN_HOLD_FRAMES = 2  # Minimum hold and gap for menu button presses
 
-    def __init__(self, path):
+    def __init__(self, path, background: bool = False,
+                 blocking: bool = False):
         log.info("Attaching Pad to Dolphin")
         self.path = path
         self.prev = Buttons.Logical.NONE
-        self.last_command_time = time.time()
+        self.last_write_time = 0.0
         self.pipe = None
+        self.background = background
+        self.blocking = blocking
+        self.frames_advanced = 0  # FLUSH commands sent in blocking mode
+        self.pending = []
+        self.pending_ready = threading.Condition()
+        self.writer = None
 
     def __del__(self, *args):
         """Closes the fifo."""
@@ -62,19 +83,62 @@ class DolphinPad:
             pass
 
     def connect(self):
-        self.pipe = open(self.path, 'w', buffering=1)
+        self.pipe = open(self.path, 'w')
+        if self.background and self.writer is None:
+            self.writer = threading.Thread(target=self.__write_loop,
+                                           daemon=True)
+            self.writer.start()
 
     def is_connected(self):
         return self.pipe is not None
 
     def _send_to_pipe(self, msg):
-        # log.info(msg)
-        current_time = time.time()
-        sleep_time = self.last_command_time + self.MIN_COOLDOWN - current_time
-        if sleep_time > 0:
+        """Queue a command for the next write."""
+        with self.pending_ready:
+            self.pending.append(msg)
+
+    def flush(self):
+        """Write all queued commands, on the writer thread if there is one."""
+        if self.background:
+            with self.pending_ready:
+                self.pending_ready.notify()
+        else:
+            self.__write_pending()
+
+    def advance(self, n_frames: int):
+        """Let the emulator run n_frames with the current button state."""
+        if not self.blocking:
+            self.flush()
+            time.sleep(n_frames * self.FRAME_INTERVAL)
+            return
+
+        with self.pending_ready:
+            self.pending.extend(['FLUSH'] * n_frames)
+        self.frames_advanced += n_frames
+        self.flush()
+
+    def __write_pending(self):
+        # A blocking emulator consumes one FLUSH per frame, no need to wait
+        sleep_time = self.last_write_time + self.FRAME_INTERVAL - time.time()
+        if sleep_time > 0 and not self.blocking:
             time.sleep(sleep_time)
-        self.last_command_time = time.time()
-        self.pipe.write('{}\n'.format(msg))
+
+        # Take the commands after the sleep, so late ones join this write
+        with self.pending_ready:
+            commands, self.pending = self.pending, []
+        if not commands:
+            return
+
+        self.pipe.write(''.join(f'{command}\n' for command in commands))
+        self.pipe.flush()
+        self.last_write_time = time.time()
+
+    def __write_loop(self):
+        while True:
+            with self.pending_ready:
+                while not self.pending:
+                    self.pending_ready.wait()
+            self.__write_pending()
 
     def _get_button_name(self, button):
         if button in self.BUTTONS_TO_CONTROLLER:
@@ -86,56 +150,66 @@ class DolphinPad:
         press = diff & button_state  # Send press for: diff AND new
         release = diff & self.prev  # Send release for: diff AND pref
         # keep = self.prev & button_state # Keep pressing: prev AND new
-        self.prev = press
+        self.prev = button_state
 
         # Release old buttons
         for i in bits(release):
-            self.release_button(Buttons.Logical(i))
+            self._send_to_pipe(self._release_command(Buttons.Logical(i)))
 
         # Press new buttons
         for i in bits(press):
-            self.press_button(Buttons.Logical(i))
+            self._send_to_pipe(self._press_command(Buttons.Logical(i)))
 
+        self.flush()
         return press, release
 
     def reset_button_state(self):
         for button in Buttons.Logical:
-            self.release_button(button)
+            self._send_to_pipe(self._release_command(button))
+        self.prev = Buttons.Logical.NONE
+        self.flush()
 
-    def press_release_button(self, button, min_timeout=0):
-        """Press and release a button. This is only for testing, don't use."""
+    def press_release_button(self, button, hold_frames=MIN_HOLD_FRAMES):
+        """Press a button for hold_frames frames, then release it."""
         assert button in Buttons.Logical
+
+        # Keep menu presses apart and held long enough to register
         self.press_button(button)
-        if min_timeout > 0:
-            time.sleep(min_timeout)
+        self.advance(max(hold_frames, self.MIN_HOLD_FRAMES))
         self.release_button(button)
+        self.advance(self.MIN_HOLD_FRAMES)
 
     def press_button(self, button):
         """Press a button."""
+        self._send_to_pipe(self._press_command(button))
+        self.flush()
+
+    def release_button(self, button):
+        """Release a button."""
+        self._send_to_pipe(self._release_command(button))
+        self.flush()
+
+    def _press_command(self, button):
         assert button in Buttons.Logical
 
         # Button pressed is a continuous button, but we will just
         # set the max value
         if button in self.ALL_CONTINUOUS_BUTTONS:
             if button in self.CONTINUOUS_BUTTONS['C'].keys():
-                self._send_to_pipe('SET {} {:.2f} {:.2f}'.format(
-                    'C', *self.CONTINUOUS_BUTTONS['C'][button]))
+                return 'SET {} {:.2f} {:.2f}'.format(
+                    'C', *self.CONTINUOUS_BUTTONS['C'][button])
             elif button in self.CONTINUOUS_BUTTONS['MAIN'].keys():
-                self._send_to_pipe('SET {} {:.2f} {:.2f}'.format(
-                    'MAIN', *self.CONTINUOUS_BUTTONS['MAIN'][button]))
+                return 'SET {} {:.2f} {:.2f}'.format(
+                    'MAIN', *self.CONTINUOUS_BUTTONS['MAIN'][button])
             else:
                 raise Exception('Unidentified button sent')
-        else:
-            self._send_to_pipe('PRESS {}'.format(
-                self._get_button_name(button)))
 
-    def release_button(self, button):
-        """Release a button."""
+        return 'PRESS {}'.format(self._get_button_name(button))
+
+    def _release_command(self, button):
         assert button in Buttons.Logical
         if button in self.CONTINUOUS_BUTTONS['C'].keys():
-            self._send_to_pipe('SET C 0.5 0.5')
+            return 'SET C 0.5 0.5'
         elif button in self.CONTINUOUS_BUTTONS['MAIN'].keys():
-            self._send_to_pipe('SET MAIN 0.5 0.5')
-        else:
-            self._send_to_pipe('RELEASE {}'.format(
-                self._get_button_name(button)))
+            return 'SET MAIN 0.5 0.5'
+        return 'RELEASE {}'.format(self._get_button_name(button))
@@ -0,0 +1,85 @@
+from typing import Tuple
+
+import numpy as np
+
+from framework.devices.device import Device
+from framework.games.ssbm.ssbm_action import (UNKNOWN_ACTION,
+                                              button_masks_to_indices)
+from framework.games.ssbm.ssbm_observation import SSBMObservation
+
+
+class SlippiReplay(Device):
+    """
+    Offline device replaying a recorded player session.
+
+    read_state returns the recorded frames one by one and set_button_state
+    records the agent's button state for the frame read last, so an agent
+    loop can step through a replay without an emulator. A whole session can
+    also be answered at once with set_button_states. The recorded human
+    actions are kept to score the agent against.
+
+    This is not a drop-in Dolphin replacement: read_state returns
+    SSBMObservation instead of the MemoryFrame SSBMDolphinBuilder consumes,
+    and there is no pad or fileno, so it cannot run under SSBMGame or
+    GameSession.
+
+    Arguments:
+    observations -- (n, SSBMObservation.size()) recorded observations
+    actions -- (n,) recorded human action indices, UNKNOWN_ACTION where the
+        human input has no matching action
+    """
+
+    def __init__(self, observations: np.ndarray, actions: np.ndarray):
+        super().__init__('slippi_replay')
+        assert len(observations) == len(actions), \
+            "Need one recorded action per observation"
+        self.observations = np.asarray(observations, dtype=np.float32)
+        self.actions = np.asarray(actions, dtype=np.int16)
+        self.chosen = np.full(len(actions), UNKNOWN_ACTION, dtype=np.int16)
+        self.cursor = -1
+
+    def __len__(self) -> int:
+        return len(self.actions)
+
+    @property
+    def done(self) -> bool:
+        return self.cursor >= len(self) - 1
+
+    def launch(self):
+        self.is_open = True
+        self.cursor = -1
+
+    def terminate(self):
+        self.is_open = False
+
+    def restart(self):
+        self.launch()
+
+    def read_state(self) -> SSBMObservation:
+        """Advance one frame and return its observation, a view."""
+        assert not self.done, "Replay has no more frames"
+        self.cursor += 1
+        return SSBMObservation.from_array(self.observations[self.cursor])
+
+    def set_button_state(self, state):
+        assert self.cursor >= 0, "Call read_state before setting buttons"
+        self.chosen[self.cursor] = button_masks_to_indices(
+            np.array([int(state)]))[0]
+
+    def set_button_states(self, states: np.ndarray):
+        """Set the agent's button state for every frame of the session."""
+        self.chosen[:] = button_masks_to_indices(states)
+        self.cursor = len(self) - 1
+
+    def score(self) -> Tuple[int, int]:
+        """
+        Compare the agent's actions with the human ones.
+
+        Returns:
+        Tuple of (frames with a known human and agent action, frames where
+        the two agree)
+        """
+        known = (self.actions != UNKNOWN_ACTION) & \
+            (self.chosen != UNKNOWN_ACTION)
+        return int(known.sum()), \
+            int((self.actions[known] == self.chosen[known]).sum())
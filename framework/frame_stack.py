@@ -0,0 +1,104 @@
+"""Fixed size history of the most recent observations."""
+
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+
+class FrameStack():
+    """
+    The last k observations and their finite-difference velocities.
+
+    Every pushed frame is stored once as a row of [observation, observation -
+    previous observation]. Rows are written twice into a buffer of 2k rows, at
+    slot and slot + k, so the last k rows are always one contiguous slice and
+    view() never copies. Memory stays fixed however long a session runs.
+    Until k frames have been pushed the stack is padded with the first frame
+    and zero velocities, matching stack().
+
+    Arguments:
+    k -- Number of frames in the stack
+    observation_size -- Length of a single observation array
+    velocities -- Append the difference to the previous frame to every frame
+    """
+
+    def __init__(self, k: int, observation_size: int, velocities: bool = True):
+        assert k > 0, "Need at least one frame in the stack"
+        self.k = k
+        self.observation_size = observation_size
+        self.velocities = velocities
+        self.row_size = observation_size * (2 if velocities else 1)
+        self.buffer = np.zeros((2 * k, self.row_size), dtype=np.float32)
+        self.position = 0  # Slot of the next write
+        self.n_frames = 0
+
+    @property
+    def size(self) -> int:
+        """Length of the flat stacked feature vector."""
+        return self.k * self.row_size
+
+    def reset(self) -> None:
+        self.position = 0
+        self.n_frames = 0
+
+    def frame(self, index: int = -1) -> np.ndarray:
+        """Return a view of one of the last k observations, -1 is newest."""
+        assert -self.k <= index < 0, f"Index must be in [-{self.k}, -1]"
+        assert self.n_frames > 0, "No frames pushed yet"
+        return self.buffer[self.position + self.k + index,
+                           :self.observation_size]
+
+    def push(self, observation: np.ndarray) -> np.ndarray:
+        """Add an observation array and return the updated view()."""
+        size = self.observation_size
+        row = self.buffer[self.position]
+
+        if self.n_frames == 0:
+            row[:size] = observation
+            row[size:] = 0.0
+            self.buffer[:] = row
+        else:
+            # With k == 1 the previous frame is the row being overwritten
+            if self.velocities:
+                np.subtract(observation, self.frame(-1), out=row[size:])
+            row[:size] = observation
+            self.buffer[self.position + self.k] = row
+
+        self.position = (self.position + 1) % self.k
+        self.n_frames += 1
+        return self.view()
+
+    def view(self) -> np.ndarray:
+        """
+        Flat view of the stack, oldest frame first.
+
+        The view is only valid until the next push, copy it to keep it.
+        """
+        return self.buffer[self.position:self.position + self.k].reshape(-1)
+
+
+def stack(observations: np.ndarray, k: int,
+          velocities: bool = True) -> np.ndarray:
+    """
+    Stack a decoded trajectory the same way FrameStack does online.
+
+    Arguments:
+    observations -- (n, observation_size) observations of one trajectory
+    k -- Number of frames in the stack
+    velocities -- Append the difference to the previous frame to every frame
+
+    Returns:
+    (n, FrameStack.size) float32 array, row t equals FrameStack.view() after
+    pushing observations[:t + 1]
+    """
+    rows = np.asarray(observations, dtype=np.float32)
+    if velocities:
+        rows = np.concatenate(
+            [rows, np.diff(rows, axis=0, prepend=rows[:1])], axis=1)
+    if len(rows) == 0:
+        return np.zeros((0, k * rows.shape[1]), dtype=np.float32)
+
+    padded = np.concatenate([np.repeat(rows[:1], k - 1, axis=0), rows])
+    windows = as_strided(padded, shape=(len(rows), k, rows.shape[1]),
+                         strides=(padded.strides[0],) + padded.strides,
+                         writeable=False)
+    return windows.reshape(len(rows), -1)
@@ -1,6 +1,6 @@
-
-import time
 import logging
+import selectors
+import time
 
 from framework.agent import Agent
 from framework.devices.device import Device
@@ -11,46 +11,131 @@ log = logging.getLogger(__name__)
 
 
 class GameSession():
+    """
+    Event loop connecting a device to a game.
+
+    The loop sleeps in a selector until the device has new state or the next
+    deadline is due: either the next SAMPLING_WINDOW tick or the
+    STALE_OBSERVATION_TIMEOUT check.
+
+    With frames_per_step set, the game is instead stepped in lockstep with
+    the emulator, which needs a device with blocking input. The device waits
+    for input on every frame, and after every step the session advances it
+    by frames_per_step frames with the chosen action applied. The next step
+    is due once the builder reported all of those frames, plus any frames
+    the game advanced the device by itself, e.g. to navigate menus. The
+    agent sees every frames_per_step-th frame no matter how fast the host
+    emulates or how long the agent takes to act. Steps where the device ran
+    past the frames it was given, i.e. did not block, are counted in
+    late_steps.
+    """
 
     SAMPLING_WINDOW = 1.0/15.0  # Seconds
     STALE_OBSERVATION_TIMEOUT = 20  # Seconds
+    BLOCKED_TIMEOUT = 1.0  # Seconds without frames before stepping anyway
 
     def __init__(self, agent: Agent, device: Device, game: Game,
-                 builder: StateBuilder):
+                 builder: StateBuilder, frames_per_step: int = None):
+        # A blocking device only runs when advanced, which lockstep does
+        if (frames_per_step is not None) != \
+                getattr(device, 'blocking_input', False):
+            raise ValueError('frames_per_step needs a device with blocking '
+                             'input, and a blocking device needs '
+                             'frames_per_step')
         self.agent = agent
         self.device = device
         self.game = game
         self.device_update_builder = builder
+        self.frames_per_step = frames_per_step
         self.last_update = time.time()
+        self.last_frame = None
+        self.last_progress_time = time.time()  # Last new frame or step
+        self.frames_seen = 0  # Distinct frames reported by the builder
+        self.sync_seen = 0
+        self.sync_advanced = 0
+        self.late_steps = 0
+
+    def __count_frame(self) -> None:
+        frame = self.device_update_builder.frame
+        if frame is not None and frame != self.last_frame:
+            self.frames_seen += 1
+            self.last_frame = frame
+            self.last_progress_time = time.time()
+
+    def __sync(self) -> None:
+        """Mark every frame the device was advanced by as consumed."""
+        self.sync_seen = self.frames_seen
+        self.sync_advanced = self.device.frames_advanced
+        self.last_progress_time = time.time()
+
+    def __step_due(self, new_time: float, next_sample: float) -> bool:
+        if self.frames_per_step is None:
+            return new_time >= next_sample
+
+        # Frames the device was given but has not reported yet
+        pending = (self.device.frames_advanced - self.sync_advanced) - \
+            (self.frames_seen - self.sync_seen)
+        if pending > 0:
+            # Frames that never show up, e.g. while booting, must not stall
+            return new_time - self.last_progress_time >= self.BLOCKED_TIMEOUT
+        if pending < 0:
+            self.late_steps += 1
+            log.debug(f'Device ran {-pending} frames past its input')
+        return True
 
     def start(self):
         self.device.launch()
         last_meta_update = time.time()
+        game_update = None
+
+        selector = selectors.DefaultSelector()
+        selector.register(self.device, selectors.EVENT_READ)
 
         while True:
+            next_sample = self.last_update + self.SAMPLING_WINDOW
+            stale_deadline = last_meta_update + \
+                self.STALE_OBSERVATION_TIMEOUT
+            # In lockstep mode new frames from the device trigger steps
+            deadline = min(self.last_progress_time + self.BLOCKED_TIMEOUT
+                           if self.frames_per_step is not None
+                           else next_sample, stale_deadline)
+            timeout = max(0.0, deadline - time.time())
+
+            if selector.select(timeout):
+                meta_update, game_update = \
+                    self.device_update_builder.transform(
+                        self.device.read_state())
+                self.__count_frame()
+
+                if meta_update is not None:
+                    self.game.meta_update(meta_update)
+                    last_meta_update = time.time()
+
             new_time = time.time()
-            vals = self.device.read_state()
-            meta_update, game_update = self.device_update_builder.transform(
-                vals)
 
             # If we have not received an observation before the stale timeout,
             # signal to restart
             # We are in an invalid state
-            if new_time > (last_meta_update +
-                           self.STALE_OBSERVATION_TIMEOUT):
+            # A meta update read in this iteration moves the deadline
+            if new_time > last_meta_update + self.STALE_OBSERVATION_TIMEOUT:
                 log.warning('Stale device detected. Restarting device...')
                 self.device.restart()
                 self.game.hard_reset()
                 last_meta_update = time.time()
+                game_update = None
+                if self.frames_per_step is not None:
+                    self.__sync()
                 continue
 
-            if meta_update is not None:
-                self.game.meta_update(meta_update)
-                last_meta_update = time.time()
-
-            if new_time >= (self.last_update + self.SAMPLING_WINDOW):
+            if self.__step_due(new_time, next_sample):
+                if self.frames_per_step is not None:
+                    self.__sync()
 
                 if game_update is not None:
                     self.game.game_update(game_update)
 
+                # Run the next frames with the action applied
+                if self.frames_per_step is not None:
+                    self.device.advance(self.frames_per_step)
+
                 self.last_update = time.time()
@@ -1,6 +1,7 @@
 
 import json
-from typing import List, Union
+import os
+from typing import Dict, List, Union
 
 from framework.agent import Agent
 from framework.devices.device import Device
@@ -8,25 +9,70 @@ from framework.observation import Observation
 
 
 class GameStats():
+    """
+    Append-only log of per game statistics.
+
+    Every game is one JSON object on its own line, written and flushed when
+    the game ends, so the cost of a record does not depend on how many games
+    came before it. Read the log incrementally with GameStatsReader.
+    """
 
     def __init__(self, file_name: Union[str, None]):
         self.fp = None
-        self.data_store = []
+        self.n_records = 0
         self.file_name = file_name
 
-    def append(self, total_reward: float, total_timesteps: int):
-        self.data_store.append(
-            dict(total_reward=total_reward, total_timesteps=total_timesteps))
-        self.dump()
+    def append(self, total_reward: float, total_timesteps: int, **stats):
+        """Write the stats of a game, extra stats are stored by name."""
+        self.n_records += 1
+        if self.file_name is None:
+            return
 
-    def dump(self):
-        if self.file_name is not None:
-            with open(self.file_name, 'w') as f:
-                json.dump(self.data_store, f)
+        if self.fp is None:
+            self.fp = open(self.file_name, 'a')
+        record = dict(total_reward=total_reward,
+                      total_timesteps=total_timesteps, **stats)
+        self.fp.write(json.dumps(record) + '\n')
+        self.fp.flush()
 
     def __del__(self):
+        try:
+            self.fp.close()
+        except AttributeError:
+            pass
         self.fp = None
-        self.data_store = None
+
+
+class GameStatsReader():
+    """
+    Incremental reader of a GameStats log.
+
+    Remembers how far the log has been read, so every call only parses the
+    records written since the previous one. A partially written last line is
+    left for the next call.
+    """
+
+    def __init__(self, file_name: str):
+        self.file_name = file_name
+        self.offset = 0
+
+    def read_new(self) -> List[Dict]:
+        try:
+            f = open(self.file_name, 'rb')
+        except FileNotFoundError:
+            return []
+
+        with f:
+            # Start over if the log was truncated or replaced
+            if os.fstat(f.fileno()).st_size < self.offset:
+                self.offset = 0
+            f.seek(self.offset)
+            data = f.read()
+
+        end = data.rfind(b'\n') + 1
+        self.offset += end
+        return [json.loads(line) for line in data[:end].splitlines()
+                if line.strip()]
 
 
 class Game():
@@ -1,15 +1,19 @@
 
 import logging
 import time
-from typing import List
+from typing import Callable, List
 
+import numpy as np
 from transitions import Machine
 
 from framework.agent import Agent
 from framework.devices.device import Device
+from framework.frame_stack import FrameStack
 from framework.games.game import Game
+from framework.games.ssbm.ssbm_action import SSBMAction
+from framework.games.ssbm.ssbm_episode import SSBMEpisodeStats
 from framework.games.ssbm.ssbm_menu_helper import SSBMMenuHelper
-from framework.games.ssbm.ssbm_observation import Position, SSBMObservation
+from framework.games.ssbm.ssbm_observation import SSBMObservation
 from framework.games.ssbm.ssbm_reward import SimpleSSBMReward
 
 logging.basicConfig(level=logging.DEBUG)
@@ -25,19 +29,34 @@ class SSBMGame(Game):
               'stage_selection', 'game_launched', 'game_done']
 
     STALE_OBSERVATION_TIMEOUT = 5.0
+    HISTORY_SIZE = 4  # Default number of recent frames kept in self.frames
+    META_HISTORY = 3  # Menu state changes needed to detect the game end
 
     def __init__(self,
                  device: Device,
                  agents: List[Agent],
                  sampling_window: float,
-                 stats_file=None):
+                 stats_file=None,
+                 history_size: int = HISTORY_SIZE,
+                 save_callback: Callable[[], None] = None):
         super().__init__(device, agents=agents, stats_file=stats_file)
+        # Replaces saving the agents at the end of a game, e.g. to save them
+        # on the thread that uses them
+        self.save_callback = save_callback
+        # Menu holds are counted in frames, which a non-blocking device can
+        # only wait for in wall-clock time at real-time speed
+        if getattr(device, 'emulation_speed', 1.0) != 1.0 and \
+                not getattr(device, 'blocking_input', False):
+            raise ValueError('SSBMGame needs emulation_speed 1.0 or a device '
+                             'with blocking input to time menu navigation')
         self.n_games = 0
         self.sampling_window = sampling_window
         self.machine = self._build_state_machine()
         self.menu_helper = SSBMMenuHelper(self.device.pad)
         self.reward_calculator = SimpleSSBMReward()
-        self.all_obervations = []
+        # Only a fixed window of frames and running totals are kept per game
+        self.frames = FrameStack(history_size, SSBMObservation.size())
+        self.episode = SSBMEpisodeStats()
         self.reset_state()
 
     def _build_state_machine(self):
@@ -84,6 +103,7 @@ class SSBMGame(Game):
         if not self.prev_meta_updates or \
                 self.prev_meta_updates[-1] != update_data:
             self.prev_meta_updates.append(update_data)
+            del self.prev_meta_updates[:-self.META_HISTORY]
         log.info(self.prev_meta_updates)
 
         if update_data == 6 and self.state == 'not_started':
@@ -92,19 +112,25 @@ class SSBMGame(Game):
 
         if self.prev_meta_updates[-3:] == [13, 11, 12] and \
                 self.state == 'game_launched':
-            self.stats.append(self.total_game_reward,
-                              self.frame_counter)
-            log.info(f'GAME STATS: {self.stats.data_store}')
+            stats = self.episode.as_dict()
+            if self.agents:
+                stats['epsilon'] = getattr(self.agents[0], 'epsilon', None)
+            self.stats.append(**stats)
+            log.info(f'GAME STATS: {stats}')
             self.save_agents()
             self.finish_game()
 
-    def game_update(self, observation):
+    def wants_action(self, observation: SSBMObservation) -> bool:
+        """Return True if the agents should act on the observation."""
         if self.state != 'game_launched':
-            return
+            return False
 
         # Wait for stock information
-        if observation.player_stocks == 0 and \
-                observation.enemy_stocks == 0:
+        return not (observation.player_stocks == 0 and
+                    observation.enemy_stocks == 0)
+
+    def game_update(self, observation):
+        if not self.wants_action(observation):
             return
 
         self.update_agents(observation)
@@ -116,8 +142,8 @@ class SSBMGame(Game):
     def reset_state(self):
         self.last_update = time.time()
         self.frame_counter = 0
-        self.all_obervations = []
-        self.total_game_reward = 0
+        self.frames.reset()
+        self.episode.reset()
         self.prev_meta_updates = []
         self.n_games += 1
 
@@ -129,29 +155,48 @@ class SSBMGame(Game):
         self.restart_game()
 
     def save_agents(self):
+        if self.save_callback is not None:
+            self.save_callback()
+            return
+
         for agent in self.agents:
             agent.save()
 
     def update_agents(self, observation: SSBMObservation):
         for agent in self.agents:
+            start = time.perf_counter()
             action = agent.act(observation, self.n_games)
-            # log.info(f"Should take action: {action}")
-            self.device.set_button_state(action.as_slippi_bitmask())
-
-            if self.all_obervations:
-                reward = self.reward_calculator.cost(
-                    observation, self.all_obervations, self.frame_counter)
-                self.total_game_reward += reward
-                agent.learn(self.all_obervations[-1],
-                            observation, action, reward, 0.0)
-                log.info(f'Reward: {reward}')
-
-        previous_observation = SSBMObservation(
-            Position(observation.player_x, observation.player_y),
-            Position(observation.enemy_x, observation.enemy_y),
-            observation.player_stocks, observation.enemy_stocks,
-            observation.player_percent, observation.enemy_percent)
-        self.all_obervations.append(previous_observation)
+            self.episode.act_seconds += time.perf_counter() - start
+            self.apply_action(agent, observation, action)
+
+        self.record_observation(observation)
+
+    def apply_action(self, agent: Agent, observation: SSBMObservation,
+                     action: SSBMAction):
+        """Send an action picked for the observation and learn from it."""
+        # log.info(f"Should take action: {action}")
+        self.device.set_button_state(action.as_slippi_bitmask())
+
+        if self.frames.n_frames:
+            previous = self.frames.frame(-1)
+            reward = self.reward_calculator.cost(
+                observation, [SSBMObservation.from_array(previous)],
+                self.frame_counter)
+            self.episode.add_reward(reward)
+            start = time.perf_counter()
+            loss = agent.learn(previous[np.newaxis],
+                               observation.as_array()[np.newaxis],
+                               np.array([action.as_index()]),
+                               np.array([reward]), np.array([0.0]))
+            self.episode.learn_seconds += time.perf_counter() - start
+            if loss is not None:
+                self.episode.add_loss(float(loss))
+            log.info(f'Reward: {reward}')
+
+    def record_observation(self, observation: SSBMObservation):
+        previous = self.frames.frame(-1) if self.frames.n_frames else None
+        self.episode.update(previous, observation.as_array())
+        self.frames.push(observation.as_array())
         self.frame_counter += 1
 
     def _is_done(self, observation: SSBMObservation):
@@ -160,7 +205,7 @@ class SSBMGame(Game):
 
     def on_enter_start_menu(self):
         self.menu_helper.go_to_character_select()
-        time.sleep(2)
+        self.menu_helper.wait(120)
         self.select_characters()
 
     def on_enter_character_selection(self):
@@ -179,10 +224,10 @@ class SSBMGame(Game):
         self.preselect_select_stage()
 
     def on_exit_character_preselection(self):
-        time.sleep(3)
+        self.menu_helper.wait(180)
         self.menu_helper.preselect_characters()
-        time.sleep(2)
+        self.menu_helper.wait(120)
 
     def on_enter_game_done(self):
-        time.sleep(5)  # Wait for stats screen to appear
+        self.menu_helper.wait(300)  # Wait for stats screen to appear
         self.restart()
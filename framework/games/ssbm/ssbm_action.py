@@ -1,6 +1,5 @@
 """Classes denoting different actions."""
 
-import inspect
 import os
 from typing import Union
 
@@ -12,6 +11,7 @@ from slippi.event import Buttons
 VALID_ACTIONS = np.load(os.path.dirname(__file__) + '/ssbm_actions.npy')
 N_LOGICAL_INPUTS = len(VALID_ACTIONS[0])
 N_ACTIONS = len(VALID_ACTIONS)
+UNKNOWN_ACTION = -1
 STATE_TO_INDEX_LOOKUP = {
     tuple(vl): idx for idx, vl in enumerate(VALID_ACTIONS)
 }
@@ -34,10 +34,30 @@ STATE_TO_SLIPPI = [
     Buttons.Logical.R,
     Buttons.Logical.Z,
 ]
+STATE_TO_SLIPPI_BITS = np.array([int(b) for b in STATE_TO_SLIPPI],
+                                dtype=np.uint32)
+
+# Weight of every controller state entry in a 16-bit state code
+STATE_CODE_WEIGHTS = 1 << np.arange(N_LOGICAL_INPUTS, dtype=np.int64)
+
+NAMED_STATE = ('trigger', 'cstick_right', 'cstick_left', 'cstick_down',
+               'cstick_up', 'joystick_right', 'joystick_left',
+               'joystick_down', 'joystick_up', 'y', 'x', 'b', 'a', 'l', 'r',
+               'z')
 
 
 class SSBMAction(Action):
-    """Denoting an action taken in a single frame."""
+    """
+    Denoting an action taken in a single frame.
+
+    Actions in the action space are flyweights: from_index returns one shared,
+    immutable instance per action index with cached one-hot and Slippi
+    bitmask representations.
+    """
+
+    __slots__ = ('state', '_index')
+
+    named_state = NAMED_STATE
 
     def __init__(self, trigger: int = 0, cstick_right: int = 0,
                  cstick_left: int = 0, cstick_down: int = 0,
@@ -51,9 +71,7 @@ class SSBMAction(Action):
         Each entry is either 0 or 1 denoting if the button or logical input is
         active. Defaults to all zeros, aka 'idle'.
         """
-        frame = inspect.currentframe()
-        args, _, _, _ = inspect.getargvalues(frame)
-        self.named_state = args[1:]
+        self._index = None
         self.state = np.array([trigger, cstick_right, cstick_left, cstick_down,
                                cstick_up, joystick_right, joystick_left,
                                joystick_down, joystick_up, y, x, b, a, l,
@@ -68,27 +86,23 @@ class SSBMAction(Action):
         self.state = simplify_action(self.state)
 
     @classmethod
-    def from_index(cls, index: int):
-        return cls(*VALID_ACTIONS[index])
+    def from_index(cls, index: int) -> 'SSBMAction':
+        """Return the shared action instance of an action index."""
+        return ACTIONS[index]
 
     def as_array(self) -> np.array:
-        """Return the controller state as 1-dimensional(1,) numpy array."""
-        array = np.zeros(N_ACTIONS)
-        array[self.as_index()] = 1
-        return array
+        """Return the controller state as a read-only one-hot numpy array."""
+        return ONE_HOT_ACTIONS[self.as_index()]
 
     def as_index(self) -> int:
         """Return the Action index of this controller state."""
+        if self._index is not None:
+            return self._index
         return reverse_action_lookup(self.state)
 
     def as_slippi_bitmask(self) -> Buttons.Logical:
         """Return action(s) as Slippi bitmask."""
-        res = Buttons.Logical(Buttons.Logical.NONE)
-        for i, mask in enumerate(STATE_TO_SLIPPI):
-            if self.state[i]:
-                res |= mask
-
-        return res
+        return SLIPPI_BITMASKS[self.as_index()]
 
     def __str__(self):  # noqa
         tupled_actions = zip(self.named_state, self.state)
@@ -147,3 +161,109 @@ def simplify_action(action: np.array) -> np.array:
         action[5:9] = joystick
 
     return action
+
+
+def simplify_actions(states: np.ndarray) -> np.ndarray:
+    """Vectorized simplify_action over a (n, 16) array of 0/1 states."""
+    states = np.array(states, dtype=np.uint8)
+
+    # A before B
+    rows = states[:, 11] + states[:, 12] > 1
+    states[rows, 11] = 0
+    states[rows, 12] = 1
+
+    # C stick before joystick
+    rows = states[:, 1:5].sum(axis=1) == 1
+    states[rows, 5:9] = 0
+
+    # R before L
+    rows = states[:, 13] == 1
+    states[rows, 14] = 1
+    states[rows, 13] = 0
+
+    # Y before X
+    rows = states[:, 9] == 1
+    states[rows, 10] = 1
+    states[rows, 9] = 0
+
+    # Z before anything
+    rows = states[:, 15] == 1
+    states[rows] = 0
+    states[rows, 15] = 1
+
+    # Only joystick with block
+    rows = states[:, 14] == 1
+    joystick = states[rows, 5:9]
+    states[rows] = 0
+    states[rows, 14] = 1
+    states[rows, 5:9] = joystick
+
+    return states
+
+
+def state_codes(states: np.ndarray) -> np.ndarray:
+    """Pack (n, 16) 0/1 controller states into 16-bit integer codes."""
+    return (np.asarray(states) > 0).astype(np.int64) @ STATE_CODE_WEIGHTS
+
+
+def logical_to_state_codes(masks: np.ndarray) -> np.ndarray:
+    """Pack Slippi logical button masks into 16-bit controller state codes."""
+    masks = np.asarray(masks, dtype=np.uint32)
+    return state_codes((masks[:, np.newaxis] & STATE_TO_SLIPPI_BITS) != 0)
+
+
+def _build_state_code_to_index() -> np.ndarray:
+    code_to_index = np.full(1 << N_LOGICAL_INPUTS, UNKNOWN_ACTION,
+                            dtype=np.int16)
+    code_to_index[state_codes(VALID_ACTIONS)] = np.arange(N_ACTIONS)
+
+    # Every possible raw controller state, simplified, then looked up
+    all_states = (np.arange(1 << N_LOGICAL_INPUTS)[:, np.newaxis] >>
+                  np.arange(N_LOGICAL_INPUTS)) & 1
+    return code_to_index[state_codes(simplify_actions(all_states))]
+
+
+# Raw 16-bit controller state code -> simplified action index, or
+# UNKNOWN_ACTION for states outside of the action space
+STATE_CODE_TO_INDEX = _build_state_code_to_index()
+
+# Action index -> Slippi logical bitmask
+INDEX_TO_BITMASK = (VALID_ACTIONS.astype(np.uint32) *
+                    STATE_TO_SLIPPI_BITS).sum(axis=1).astype(np.uint32)
+
+
+# Action index -> cached Slippi bitmask
+SLIPPI_BITMASKS = tuple(Buttons.Logical(int(mask))
+                        for mask in INDEX_TO_BITMASK)
+
+# Row i is the one-hot encoding of action index i
+ONE_HOT_ACTIONS = np.eye(N_ACTIONS, dtype=np.float32)
+ONE_HOT_ACTIONS.setflags(write=False)
+
+
+def _build_actions():
+    actions = []
+    for index, state in enumerate(VALID_ACTIONS):
+        action = SSBMAction(*state)
+        action.state = tuple(action.state)  # Shared, so never mutated
+        action._index = index
+        actions.append(action)
+    return tuple(actions)
+
+
+# Action index -> shared SSBMAction instance
+ACTIONS = _build_actions()
+
+
+def button_masks_to_indices(masks: np.ndarray) -> np.ndarray:
+    """
+    Map Slippi logical button masks to action indices in one gather.
+
+    Arguments:
+    masks -- Array of Slippi logical button masks
+
+    Returns:
+    An int16 array of action indices, UNKNOWN_ACTION for masks that do not map
+    to any action in the action space
+    """
+    return STATE_CODE_TO_INDEX[logical_to_state_codes(np.ravel(masks))]
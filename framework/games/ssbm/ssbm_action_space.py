@@ -1,10 +1,14 @@
+import numpy as np
 
 from framework.action_space import DiscreteActionSpace
-from framework.games.ssbm.ssbm_action import VALID_ACTIONS, SSBMAction
+from framework.games.ssbm.ssbm_action import ACTIONS, ONE_HOT_ACTIONS
 
 
 class SSBMActionSpace(DiscreteActionSpace):
 
     def __init__(self):
-        actions = [SSBMAction(*v) for v in VALID_ACTIONS]
-        super().__init__(actions)
+        super().__init__(list(ACTIONS))
+
+    def one_hot(self, indices: np.ndarray) -> np.ndarray:
+        """Return the cached one-hot rows of a batch of action indices."""
+        return ONE_HOT_ACTIONS[indices]
@@ -0,0 +1,97 @@
+"""Streaming statistics of a single game."""
+
+import time
+from typing import Dict
+
+import numpy as np
+
+from framework.games.ssbm.ssbm_reward import (ENEMY_PERCENT, ENEMY_STOCKS,
+                                              PLAYER_PERCENT, PLAYER_STOCKS)
+
+
+class SSBMEpisodeStats():
+    """
+    Aggregates of a game, updated one frame at a time.
+
+    Only running totals are kept, so memory stays constant no matter how long
+    a game runs or gets stuck.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self.n_frames = 0
+        self.total_reward = 0.0
+        self.stocks_lost = 0
+        self.stocks_taken = 0
+        self.damage_taken = 0.0
+        self.damage_dealt = 0.0
+        self.stock_frames = 0  # Frames survived on the current stock
+        self.longest_stock_frames = 0
+        self.loss_sum = 0.0
+        self.n_losses = 0
+        self.start_time = time.time()
+        self.act_seconds = 0.0  # Wall-clock time spent picking actions
+        self.learn_seconds = 0.0  # Wall-clock time spent in agent.learn
+
+    def add_reward(self, reward: float) -> None:
+        self.total_reward += reward
+
+    def add_loss(self, loss: float) -> None:
+        self.loss_sum += loss
+        self.n_losses += 1
+
+    def update(self, previous: np.ndarray, current: np.ndarray) -> None:
+        """
+        Add a frame.
+
+        Arguments:
+        previous -- Observation array of the previous frame, None for the
+            first frame of the game
+        current -- Observation array of the new frame
+        """
+        self.n_frames += 1
+        self.stock_frames += 1
+        if previous is None:
+            return
+
+        stocks_lost = int(previous[PLAYER_STOCKS] - current[PLAYER_STOCKS])
+        if stocks_lost > 0:
+            self.stocks_lost += stocks_lost
+            self.longest_stock_frames = max(self.longest_stock_frames,
+                                            self.stock_frames - 1)
+            self.stock_frames = 1
+        self.stocks_taken += max(
+            0, int(previous[ENEMY_STOCKS] - current[ENEMY_STOCKS]))
+
+        # Percent drops back to 0 with a lost stock, only count increases
+        self.damage_taken += max(
+            0.0, float(current[PLAYER_PERCENT] - previous[PLAYER_PERCENT]))
+        self.damage_dealt += max(
+            0.0, float(current[ENEMY_PERCENT] - previous[ENEMY_PERCENT]))
+
+    @property
+    def mean_stock_frames(self) -> float:
+        """Average frames the player survived per stock, current included."""
+        return self.n_frames / (self.stocks_lost + 1)
+
+    @property
+    def mean_loss(self) -> float:
+        """Average training loss, None if the agent did not train."""
+        return self.loss_sum / self.n_losses if self.n_losses else None
+
+    def as_dict(self) -> Dict[str, float]:
+        return dict(total_reward=self.total_reward,
+                    total_timesteps=self.n_frames,
+                    stocks_lost=self.stocks_lost,
+                    stocks_taken=self.stocks_taken,
+                    damage_taken=self.damage_taken,
+                    damage_dealt=self.damage_dealt,
+                    mean_stock_frames=self.mean_stock_frames,
+                    longest_stock_frames=max(self.longest_stock_frames,
+                                             self.stock_frames),
+                    mean_loss=self.mean_loss,
+                    duration_seconds=time.time() - self.start_time,
+                    act_seconds=self.act_seconds,
+                    learn_seconds=self.learn_seconds)
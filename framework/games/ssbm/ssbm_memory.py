@@ -0,0 +1,145 @@
+"""
+Declarative schema of the SSBM memory read through the MemoryWatcher.
+
+The schema is the single source of the watched addresses: it generates the
+MemoryWatcher Locations file and compiles into a decoder that turns a whole
+memory frame into one float32 vector with a couple of NumPy operations.
+
+Regenerate the Locations file after changing the schema with:
+    python -m framework.games.ssbm.ssbm_memory
+"""
+
+from pathlib import Path
+from typing import NamedTuple, Sequence, Text
+
+import numpy as np
+
+from framework.games.ssbm.ssbm_observation import FIELDS
+
+LOCATIONS_FILE = Path(__file__).parents[2] / 'devices' / 'dolphin' / \
+    'config' / 'Locations.txt'
+
+# Pointers to the player entity structs, fields are offsets into them
+PLAYER_POINTER = '80453130'
+ENEMY_POINTER = '80453FC0'
+
+
+class MemoryField(NamedTuple):
+    """
+    One watched 32-bit value.
+
+    Arguments:
+    name -- Name of the field in the decoded frame
+    address -- MemoryWatcher address, a pointer chain is the base address
+        followed by space separated hex offsets
+    is_float -- Read the value as a float instead of an unsigned integer
+    shift -- Right shift applied to integer values
+    mask -- Mask applied to integer values after the shift
+    """
+    name: Text
+    address: Text
+    is_float: bool = False
+    shift: int = 0
+    mask: int = 0xFFFFFFFF
+
+
+def _entity_fields(prefix: Text, pointer: Text) -> Sequence[MemoryField]:
+    return (
+        MemoryField(f'{prefix}_action_state', f'{pointer} 70'),
+        MemoryField(f'{prefix}_facing', f'{pointer} 8C', is_float=True),
+        MemoryField(f'{prefix}_speed_x', f'{pointer} E0', is_float=True),
+        MemoryField(f'{prefix}_speed_y', f'{pointer} E4', is_float=True),
+        MemoryField(f'{prefix}_shield', f'{pointer} 19F8', is_float=True),
+        MemoryField(f'{prefix}_hitstun', f'{pointer} 23A0', is_float=True),
+    )
+
+
+SCHEMA = (
+    MemoryField('player_stocks', '8045310E', shift=24),
+    MemoryField('enemy_stocks', '80453F9E', shift=24),
+    MemoryField('player_percent', '804530E0', shift=16),
+    MemoryField('enemy_percent', '80453F70', shift=16),
+    MemoryField('player_x', '80453090', is_float=True),
+    MemoryField('player_y', '80453094', is_float=True),
+    MemoryField('enemy_x', '80453F20', is_float=True),
+    MemoryField('enemy_y', '80453F24', is_float=True),
+    MemoryField('menu_state', '8065CC14', shift=20, mask=0x0F),
+    MemoryField('frame', '80479D60'),
+) + _entity_fields('player', PLAYER_POINTER) + \
+    _entity_fields('enemy', ENEMY_POINTER)
+
+
+class MemoryDecoder():
+    """
+    Decoder compiled from a memory schema.
+
+    A memory frame holds 4 big-endian bytes per field in schema order. It is
+    viewed as both unsigned integers and floats, and every field is picked
+    from the right view with its shift and mask applied, all in one
+    vectorized pass. Integer fields such as the frame counter and action
+    states are also available exactly as uint32, float32 only represents
+    integers up to 2^24.
+    """
+
+    def __init__(self, schema: Sequence[MemoryField] = SCHEMA):
+        self.schema = tuple(schema)
+        self.names = tuple(field.name for field in self.schema)
+        self.addresses = tuple(field.address for field in self.schema)
+        self.is_float = np.array([field.is_float for field in self.schema])
+        self.shifts = np.array([field.shift for field in self.schema],
+                               dtype=np.uint32)
+        self.masks = np.array([field.mask for field in self.schema],
+                              dtype=np.uint32)
+
+        # Named, zero-copy views of a decoded frame
+        self.dtype = np.dtype([(name, np.float32) for name in self.names])
+        self.integer_dtype = np.dtype([(name, np.uint32)
+                                       for name in self.names])
+
+    def index(self, name: Text) -> int:
+        return self.names.index(name)
+
+    def locations(self) -> Text:
+        """Content of the MemoryWatcher Locations file for the schema."""
+        return ''.join(f'{address}\n' for address in self.addresses)
+
+    def decode(self, values: bytes, out: np.ndarray = None,
+               integers_out: np.ndarray = None) -> np.ndarray:
+        """
+        Decode a memory frame.
+
+        Arguments:
+        values -- 4 bytes per field in schema order
+        out -- Optional float32 array of len(schema) to decode into
+        integers_out -- Optional uint32 array of len(schema) that receives
+            the exact shifted and masked integer values, meaningless for
+            float fields
+
+        Returns:
+        float32 array with one value per field, view it with dtype for named
+        access
+        """
+        integers = np.frombuffer(values, dtype='>u4')
+        floats = integers.view('>f4')
+
+        if out is None:
+            out = np.empty(len(self.schema), dtype=np.float32)
+        if integers_out is None:
+            integers_out = np.empty(len(self.schema), dtype=np.uint32)
+        np.bitwise_and(integers >> self.shifts, self.masks, out=integers_out)
+        out[:] = np.where(self.is_float, floats, integers_out)
+        return out
+
+    def observation_indices(self, fields: Sequence[Text] = FIELDS) -> \
+            np.ndarray:
+        """Positions of the given fields in a decoded frame."""
+        return np.array([self.index(name) for name in fields])
+
+
+def _main():
+    LOCATIONS_FILE.write_text(MemoryDecoder().locations())
+    print(f'Wrote {len(SCHEMA)} addresses to {LOCATIONS_FILE}')
+
+
+if __name__ == '__main__':
+    _main()
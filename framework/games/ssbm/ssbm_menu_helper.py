@@ -1,54 +1,62 @@
-import time
-
 from slippi.event import Buttons
 
 
 class SSBMMenuHelper:
+    """
+    Scripted menu navigation.
+
+    All holds and waits are counted in emulator frames, 60 per second, so
+    the script lands on the same menu entries at any emulation speed when
+    the pad runs in blocking mode.
+    """
 
     def __init__(self, pad):
         self.pad = pad
 
+    def wait(self, n_frames: int):
+        self.pad.advance(n_frames)
+
     def go_to_character_select(self):
         self.pad.press_release_button(Buttons.Logical.START)
-        time.sleep(2)
+        self.wait(120)
         self.pad.press_release_button(Buttons.Logical.START)
-        time.sleep(4)
+        self.wait(240)
         self.pad.press_release_button(Buttons.Logical.DPAD_DOWN)
-        time.sleep(2)
+        self.wait(120)
         self.pad.press_release_button(Buttons.Logical.A)
-        time.sleep(1)
+        self.wait(60)
         self.pad.press_release_button(Buttons.Logical.A)
-        time.sleep(1)
+        self.wait(60)
 
     def select_characters(self):
         # Select Fox
-        self.pad.press_release_button(Buttons.Logical.JOYSTICK_UP, 0.22)
-        self.pad.press_release_button(Buttons.Logical.JOYSTICK_RIGHT, 0.05)
-        self.pad.press_release_button(Buttons.Logical.A, 0.1)
+        self.pad.press_release_button(Buttons.Logical.JOYSTICK_UP, 13)
+        self.pad.press_release_button(Buttons.Logical.JOYSTICK_RIGHT, 3)
+        self.pad.press_release_button(Buttons.Logical.A, 6)
 
         # Select p2 as CPU
-        self.pad.press_release_button(Buttons.Logical.JOYSTICK_RIGHT, 0.05)
-        self.pad.press_release_button(Buttons.Logical.JOYSTICK_DOWN, 0.085)
+        self.pad.press_release_button(Buttons.Logical.JOYSTICK_RIGHT, 3)
+        self.pad.press_release_button(Buttons.Logical.JOYSTICK_DOWN, 5)
         self.pad.press_release_button(Buttons.Logical.A)
 
         # Confirm
-        time.sleep(0.5)
+        self.wait(30)
         self.pad.press_release_button(Buttons.Logical.START)
-        time.sleep(1)
+        self.wait(60)
 
     def select_stage(self):
-        self.pad.press_release_button(Buttons.Logical.JOYSTICK_UP, 0.005)
-        time.sleep(0.5)
+        self.pad.press_release_button(Buttons.Logical.JOYSTICK_UP)
+        self.wait(30)
 
     def start_game(self):
         self.pad.press_release_button(Buttons.Logical.A)
 
     def exit_stats_screen(self):
-        time.sleep(2)
+        self.wait(120)
         self.pad.press_release_button(Buttons.Logical.START)
-        time.sleep(1)
+        self.wait(60)
         self.pad.press_release_button(Buttons.Logical.START)
 
     def preselect_characters(self):
-        time.sleep(2)
+        self.wait(120)
         self.pad.press_release_button(Buttons.Logical.START)
@@ -1,9 +1,15 @@
 """Observation of a single frame."""
 
+from typing import List
+
 import numpy as np
 
 from framework.observation import Observation
 
+# Layout of SSBMObservation.as_array()
+FIELDS = ('player_x', 'player_y', 'enemy_x', 'enemy_y',
+          'player_stocks', 'enemy_stocks', 'player_percent', 'enemy_percent')
+
 
 class Position():
     def __init__(self, x, y):
@@ -14,16 +20,66 @@ class Position():
         return f"(x={self.x}, y={self.y})"
 
 
+def _field(index: int, cast=float):
+    """Property reading and writing one element of the observation buffer."""
+
+    def getter(self):
+        return cast(self.data[index])
+
+    def setter(self, val):
+        self.data[index] = val
+
+    return property(getter, setter)
+
+
 class SSBMObservation(Observation):
-    """Class denoting the state of a frame."""
+    """
+    Class denoting the state of a frame.
+
+    The state lives in a single float32 buffer laid out as FIELDS. The buffer
+    can be a row of a larger 2D array, so a batch of observations can share
+    one contiguous matrix.
+    """
+
+    __slots__ = ('data',)
+
+    SIZE = len(FIELDS)
+
+    player_x = _field(FIELDS.index('player_x'))
+    player_y = _field(FIELDS.index('player_y'))
+    enemy_x = _field(FIELDS.index('enemy_x'))
+    enemy_y = _field(FIELDS.index('enemy_y'))
+    player_stocks = _field(FIELDS.index('player_stocks'), int)
+    enemy_stocks = _field(FIELDS.index('enemy_stocks'), int)
+    player_percent = _field(FIELDS.index('player_percent'))
+    enemy_percent = _field(FIELDS.index('enemy_percent'))
 
     @staticmethod
     def size():
-        return len(SSBMObservation().as_array())
+        return SSBMObservation.SIZE
+
+    @classmethod
+    def from_array(cls, array: np.array):
+        """
+        Wrap an array in the format returned by as_array().
+
+        float32 arrays are wrapped without copying, so changes to the
+        observation are visible in the array and the other way around.
+        """
+        observation = cls.__new__(cls)
+        observation.data = np.asarray(array, dtype=np.float32)
+        assert observation.data.shape == (cls.SIZE,), \
+            f"Expected an array of shape ({cls.SIZE},)"
+        return observation
+
+    @classmethod
+    def from_batch(cls, array: np.array) -> List['SSBMObservation']:
+        """Wrap every row of a (n, SIZE) float32 array as an observation."""
+        return [cls.from_array(row) for row in array]
 
     def __init__(self,
-                 player_pos: Position = Position(x=0, y=0),
-                 enemy_pos: Position = Position(x=0, y=0),
+                 player_pos: Position = None,
+                 enemy_pos: Position = None,
                  player_stocks: int = 0,
                  enemy_stocks: int = 0,
                  player_percent: float = 0.0,
@@ -32,8 +88,8 @@ class SSBMObservation(Observation):
         State of a single frame(timestep).
 
         Arguments:
-        player_pos -- Tuple(float, float) with the player position
-        enemy_pos -- Tuple(float, float) with enemy position
+        player_pos -- Position with the player position, defaults to (0, 0)
+        enemy_pos -- Position with enemy position, defaults to (0, 0)
         player_stocks -- Integer denoting the number of stocks left for the
             player
         enemy_stocks -- Integer denoting the number of stocks left for the
@@ -47,48 +103,39 @@ class SSBMObservation(Observation):
         assert player_percent >= 0.0 and enemy_percent >= 0.0, \
             "Player health percentage has to be a positive value"
 
-        self.player_position = player_pos
-        self.enemy_position = enemy_pos
+        self.data = np.zeros(self.SIZE, dtype=np.float32)
+        if player_pos is not None:
+            self.player_position = player_pos
+        if enemy_pos is not None:
+            self.enemy_position = enemy_pos
         self.player_stocks = player_stocks
         self.enemy_stocks = enemy_stocks
         self.player_percent = player_percent
         self.enemy_percent = enemy_percent
 
     @property
-    def player_x(self):
-        return self.player_position.x
-
-    @player_x.setter
-    def player_x(self, val):
-        self.player_position.x = val
-
-    @property
-    def player_y(self):
-        return self.player_position.y
-
-    @player_y.setter
-    def player_y(self, val):
-        self.player_position.y = val
-
-    @property
-    def enemy_x(self):
-        return self.enemy_position.x
+    def player_position(self) -> Position:
+        return Position(self.player_x, self.player_y)
 
-    @enemy_x.setter
-    def enemy_x(self, val):
-        self.enemy_position.x = val
+    @player_position.setter
+    def player_position(self, position: Position):
+        self.player_x = position.x
+        self.player_y = position.y
 
     @property
-    def enemy_y(self):
-        return self.enemy_position.y
+    def enemy_position(self) -> Position:
+        return Position(self.enemy_x, self.enemy_y)
 
-    @enemy_y.setter
-    def enemy_y(self, val):
-        self.enemy_position.y = val
+    @enemy_position.setter
+    def enemy_position(self, position: Position):
+        self.enemy_x = position.x
+        self.enemy_y = position.y
 
     def as_array(self) -> np.array:
         """
-        Return observation as flattened numpy array.
+        Return observation as flattened float32 numpy array.
+
+        The returned array is a view of the observation, not a copy.
 
         Format:
         [px, py, ex, ey, p_stock, e_stock, p_percent, e_percent], where
@@ -96,10 +143,10 @@ class SSBMObservation(Observation):
           'p' denotes player
           'e' denotes enemy
         """
-        return np.array([self.player_position.x, self.player_position.y,
-                         self.enemy_position.x, self.enemy_position.y,
-                         float(self.player_stocks), float(self.enemy_stocks),
-                         self.player_percent, self.enemy_percent])
+        return self.data
+
+    def copy(self) -> 'SSBMObservation':
+        return SSBMObservation.from_array(self.data.copy())
 
     def __str__(self):  # noqa
         return f'Observation(player_state=({self.player_position}, ' \
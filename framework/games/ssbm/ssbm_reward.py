@@ -2,9 +2,17 @@
 
 from typing import List
 
+import numpy as np
+
+from framework.games.ssbm.ssbm_observation import FIELDS
 from framework.observation import Observation
 from framework.reward import Reward
 
+PLAYER_STOCKS = FIELDS.index('player_stocks')
+ENEMY_STOCKS = FIELDS.index('enemy_stocks')
+PLAYER_PERCENT = FIELDS.index('player_percent')
+ENEMY_PERCENT = FIELDS.index('enemy_percent')
+
 
 class SimpleSSBMReward(Reward):
 
@@ -35,3 +43,34 @@ class SimpleSSBMReward(Reward):
         cost += enemy_life_diff * self.LIFE_INFLICT_COST
 
         return cost
+
+    def batch_cost(self, observations: np.ndarray) -> np.ndarray:
+        """
+        Compute the cost of every step of a trajectory at once.
+
+        Equivalent to calling cost for every frame t > 0 with frame t - 1 as
+        the only historical observation and t as the step.
+
+        Arguments:
+        observations -- (n_frames, 8) matrix of SSBMObservation.as_array()
+            rows
+
+        Returns:
+        float32 vector of n_frames costs, the first frame costs nothing
+        """
+        observations = np.asarray(observations, dtype=np.float64)
+        costs = np.zeros(len(observations), dtype=np.float64)
+        if len(observations) < 2:
+            return costs.astype(np.float32)
+
+        # Row t - 1 of diffs is observation t minus observation t - 1
+        diffs = np.diff(observations, axis=0)
+        steps = np.arange(1, len(observations))
+
+        costs[1:] = steps * self.TIMESTEP_COST
+        costs[1:] -= diffs[:, PLAYER_STOCKS] * self.STOCK_LOSS_COST
+        costs[1:] += diffs[:, PLAYER_PERCENT] * self.LIFE_LOSS_COST
+        costs[1:] -= diffs[:, ENEMY_STOCKS] * self.STOCK_INFLICT_COST
+        costs[1:] += diffs[:, ENEMY_PERCENT] * self.LIFE_INFLICT_COST
+
+        return costs.astype(np.float32)
@@ -1,3 +1,3 @@
 
 class Observation():
-    pass
+    __slots__ = ()
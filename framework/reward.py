@@ -1,6 +1,8 @@
 
 from typing import List
 
+import numpy as np
+
 from framework.observation import Observation
 
 
@@ -11,3 +13,6 @@ class Reward():
              historical_observations: List[Observation],
              step: int) -> float:
         raise NotImplementedError('Implement this')
+
+    def batch_cost(self, observations: np.ndarray) -> np.ndarray:
+        raise NotImplementedError('Implement this')
@@ -1,48 +1,65 @@
+import numpy as np
 
-from struct import unpack
+from framework.games.ssbm.ssbm_memory import MemoryDecoder
 from framework.games.ssbm.ssbm_observation import SSBMObservation
 
 
 class StateBuilder():
 
+    # Emulator frame of the last transform, None if the device has no counter
+    frame = None
+
     def transform(self, generic_data):
         raise NotImplementedError()
 
 
 class SSBMDolphinBuilder(StateBuilder):
+    """
+    Build observations from Dolphin memory frames.
 
-    ADDRESS_TO_PROPERTY = {
-        '8045310E': ('>I', 24, 'player_stocks'),
-        '80453F9E': ('>I', 24, 'enemy_stocks'),
-        '804530E0': ('>I', 16, 'player_percent'),
-        '80453F70': ('>I', 16, 'enemy_percent'),
-        '80453090': ('>f', 0, 'player_x'),
-        '80453094': ('>f', 0, 'player_y'),
-        '80453F20': ('>f', 0, 'enemy_x'),
-        '80453F24': ('>f', 0, 'enemy_y'),
-        '8065CC14': ('>I', 20, 'menu_state'),
-    }
-
-    def __init__(self):
-        self.observation = SSBMObservation()
+    Every memory frame is decoded in one pass by a MemoryDecoder compiled
+    from the memory schema. The observation is a subset of the decoded
+    fields; the full frame, including action states, velocities, shield and
+    hitstun, is kept in decoded_frame. Integer fields are exact in
+    decoded_integers, the frame counter is read from there.
+    """
 
-    def transform(self, dolphin_data):
-        address, buffer = dolphin_data
-        meta_update = None
+    def __init__(self, decoder: MemoryDecoder = None):
+        self.decoder = decoder if decoder is not None else MemoryDecoder()
+        self.observation = SSBMObservation()
+        self.decoded = np.zeros(len(self.decoder.schema), dtype=np.float32)
+        self.decoded_frame = self.decoded.view(self.decoder.dtype)[0]
+        self.decoded_integers = np.zeros(len(self.decoder.schema),
+                                         dtype=np.uint32)
+        self.decoded_integer_frame = self.decoded_integers.view(
+            self.decoder.integer_dtype)[0]
+        self.observation_indices = self.decoder.observation_indices()
+        self.menu_index = self.decoder.index('menu_state')
+        self.frame_index = self.decoder.index('frame')
+        self.checked_addresses = None
 
-        if address is None:
-            return meta_update, self.observation
+    def __check_addresses(self, addresses):
+        if addresses is self.checked_addresses:
+            return
+        if tuple(addresses) != self.decoder.addresses:
+            raise ValueError(
+                'MemoryWatcher locations do not match the memory schema, '
+                'regenerate them with python -m '
+                'framework.games.ssbm.ssbm_memory')
+        self.checked_addresses = addresses
 
-        operator, bit_shift, property_name = \
-            self.ADDRESS_TO_PROPERTY[address]
-        value = unpack(operator, buffer)[0]
-        if bit_shift > 0:
-            value = value >> bit_shift
+    def transform(self, memory_frame):
+        self.__check_addresses(memory_frame.addresses)
+        self.decoder.decode(memory_frame.values, out=self.decoded,
+                            integers_out=self.decoded_integers)
 
-        setattr(self.observation, property_name, value)
+        np.take(self.decoded, self.observation_indices,
+                out=self.observation.data)
+        self.frame = int(self.decoded_integers[self.frame_index])
 
-        if address == '8065CC14':
-            value = value & 0x0F
-            meta_update = value
+        # The menu state is meta data, not part of the observation
+        meta_update = None
+        if self.menu_index in memory_frame.changed:
+            meta_update = int(self.decoded_integers[self.menu_index])
 
         return meta_update, self.observation
@@ -0,0 +1,302 @@
+"""Separate playing in the emulators from training the agent."""
+
+import argparse
+import logging
+import multiprocessing
+import queue
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from algorithms.replay_buffer.replay_buffer import ReplayBuffer
+from framework.agent import Agent
+from framework.games.ssbm.ssbm_action import SSBMAction
+from framework.games.ssbm.ssbm_observation import SSBMObservation
+from smashrl.ssbm_agent import SSBMAgent
+from smashrl.vector_session import VectorSession
+
+log = logging.getLogger(__name__)
+
+
+class SharedWeights():
+    """
+    Latest network weights in shared memory with a version counter.
+
+    The learner copies all weights into one flat float32 buffer and bumps the
+    version, actors copy them out only when the version changed. Publishing
+    never waits for the actors and an actor always ends up with the newest
+    weights, no matter how many updates it missed.
+
+    Arguments:
+    context -- Multiprocessing context the actors are started with
+    weights -- Weights to size the buffer with and publish first
+    """
+
+    def __init__(self, context, weights: Sequence[np.ndarray]):
+        self.buffer = context.RawArray('f', sum(w.size for w in weights))
+        self.version = context.RawValue('L', 0)
+        self.lock = context.Lock()
+        self.publish(weights)
+
+    def publish(self, weights: Sequence[np.ndarray]) -> None:
+        flat = np.frombuffer(self.buffer, dtype=np.float32)
+        with self.lock:
+            offset = 0
+            for w in weights:
+                flat[offset:offset + w.size] = w.ravel()
+                offset += w.size
+            self.version.value += 1
+
+    def read(self, shapes: Sequence[Tuple[int, ...]], version: int) -> \
+            Tuple[int, Optional[List[np.ndarray]]]:
+        """
+        Copy out the weights if they are newer than version.
+
+        Arguments:
+        shapes -- Shape of every weight array
+        version -- Version the caller holds
+
+        Returns:
+        Tuple of (current version, list of weights or None if unchanged)
+        """
+        # Unlocked peek, a torn read only delays the copy to the next call
+        if self.version.value == version:
+            return version, None
+
+        with self.lock:
+            version = self.version.value
+            flat = np.frombuffer(self.buffer, dtype=np.float32).copy()
+
+        weights, offset = [], 0
+        for shape in shapes:
+            size = int(np.prod(shape))
+            weights.append(flat[offset:offset + size].reshape(shape))
+            offset += size
+        return version, weights
+
+
+class ActorAgent(Agent):
+    """
+    Agent running inside an actor process.
+
+    Acts with a local copy of the network, but never trains: transitions
+    handed to learn() are forwarded to the learner in batches, and weights
+    published by the learner are picked up between decisions. Neither call
+    blocks, transitions are dropped while the learner queue is full.
+
+    Arguments:
+    transitions -- Queue of transition batches read by the learner
+    weights -- Weights published by the learner
+    flush_size -- Number of transitions sent per batch
+    """
+
+    def __init__(self, transitions: multiprocessing.Queue,
+                 weights: SharedWeights, flush_size: int = 256):
+        # Actors never train, so skip allocating a full replay memory
+        self.agent = SSBMAgent(
+            inference_only=False,
+            memory=ReplayBuffer(1, SSBMObservation.size()))
+        super().__init__(self.agent.action_space)
+        self.transitions = transitions
+        self.weights = weights
+        self.weights_version = 0
+        self.weight_shapes = [w.shape for w in self.agent.get_weights()]
+        self.flush_size = flush_size
+        self.pending = []
+        self.n_pending = 0
+        self.n_dropped = 0
+
+    @property
+    def epsilon(self) -> float:
+        return self.agent.epsilon
+
+    def __poll_weights(self) -> None:
+        self.weights_version, weights = self.weights.read(
+            self.weight_shapes, self.weights_version)
+        if weights is not None:
+            self.agent.set_weights(weights)
+
+    def act(self, observation: SSBMObservation, timestep: int) -> SSBMAction:
+        self.__poll_weights()
+        return self.agent.act(observation, timestep)
+
+    def act_batch(self, observations: np.ndarray,
+                  timesteps: np.ndarray) -> List[SSBMAction]:
+        self.__poll_weights()
+        return self.agent.act_batch(observations, timesteps)
+
+    def learn(self, observations: np.ndarray, observations_next: np.ndarray,
+              actions: np.ndarray, rewards: np.ndarray,
+              done: np.ndarray) -> None:
+        # The game passes views of buffers it reuses on the next frame
+        self.pending.append(tuple(np.array(column) for column in (
+            observations, observations_next, actions, rewards, done)))
+        self.n_pending += len(actions)
+        if self.n_pending < self.flush_size:
+            return
+
+        batch = tuple(np.concatenate(column) for column in zip(*self.pending))
+        self.pending, self.n_pending = [], 0
+        try:
+            self.transitions.put_nowait(batch)
+        except queue.Full:
+            self.n_dropped += len(batch[2])
+            log.debug(f'Learner is behind, dropped {self.n_dropped} '
+                      'transitions so far')
+
+    def load(self):
+        # Weights come from the learner
+        pass
+
+    def save(self):
+        # Checkpoints are written by the learner
+        pass
+
+
+def _run_actor(actor_id: int, executable_path: Path, iso_path: Path,
+               n_envs: int, work_dir: Path,
+               transitions: multiprocessing.Queue,
+               weights: SharedWeights) -> None:
+    agent = ActorAgent(transitions, weights)
+    VectorSession(agent, executable_path, iso_path, n_envs,
+                  work_dir / f'actor-{actor_id}').start()
+
+
+class ActorLearner():
+    """
+    Online training with separate actor processes and one learner.
+
+    Every actor runs a VectorSession with an inference only ActorAgent and
+    pushes its transitions onto a shared queue. The learner stores them in
+    its replay memory, trains, and publishes the updated weights to all
+    actors every broadcast_interval learn calls. Controller latency in the
+    actors no longer depends on how long a training step takes.
+
+    Actors that die are restarted, the learner gives up with a RuntimeError
+    once more than max_restarts restarts were needed.
+
+    Arguments:
+    executable_path -- Path to the Dolphin binary
+    iso_path -- Path to the game ISO
+    n_actors -- Number of actor processes
+    envs_per_actor -- Dolphin instances run by every actor
+    work_dir -- Folder holding the Dolphin user directories
+    broadcast_interval -- Learn calls between weight publishes
+    save_interval -- Learn calls between checkpoints
+    queue_size -- Transition batches buffered for the learner
+    max_restarts -- Actor restarts allowed before training is aborted
+    """
+
+    ACTOR_CHECK_INTERVAL = 5  # Seconds
+
+    def __init__(self, executable_path: Path, iso_path: Path,
+                 n_actors: int = 2, envs_per_actor: int = 1,
+                 work_dir: Path = Path('./envs'),
+                 broadcast_interval: int = 50, save_interval: int = 1000,
+                 queue_size: int = 64, max_restarts: int = 10):
+        self.executable_path = executable_path
+        self.iso_path = iso_path
+        self.n_actors = n_actors
+        self.envs_per_actor = envs_per_actor
+        self.work_dir = Path(work_dir)
+        self.broadcast_interval = broadcast_interval
+        self.save_interval = save_interval
+        self.queue_size = queue_size
+        self.max_restarts = max_restarts
+        self.n_restarts = 0
+
+    def __start_actor(self, context, actor_id: int,
+                      transitions: multiprocessing.Queue,
+                      weights: SharedWeights) -> multiprocessing.Process:
+        actor = context.Process(
+            target=_run_actor,
+            args=(actor_id, self.executable_path, self.iso_path,
+                  self.envs_per_actor, self.work_dir, transitions, weights),
+            daemon=True)
+        actor.start()
+        return actor
+
+    def __restart_dead_actors(self, context, actors: List,
+                              transitions: multiprocessing.Queue,
+                              weights: SharedWeights) -> None:
+        for i, actor in enumerate(actors):
+            if actor.is_alive():
+                continue
+
+            self.n_restarts += 1
+            if self.n_restarts > self.max_restarts:
+                raise RuntimeError(
+                    f'Actor {i} exited with code {actor.exitcode}, giving up '
+                    f'after {self.max_restarts} restarts')
+            log.warning(f'Actor {i} exited with code {actor.exitcode}. '
+                        'Restarting actor...')
+            actor.join()
+            actors[i] = self.__start_actor(context, i, transitions, weights)
+
+    def start(self):
+        # TensorFlow does not survive a fork, every actor builds its own graph
+        context = multiprocessing.get_context('spawn')
+        transitions = context.Queue(maxsize=self.queue_size)
+
+        agent = SSBMAgent(inference_only=False)
+        agent.load()
+        weights = SharedWeights(context, agent.get_weights())
+
+        actors = [self.__start_actor(context, i, transitions, weights)
+                  for i in range(self.n_actors)]
+        log.info(f'Started {self.n_actors} actors with '
+                 f'{self.envs_per_actor} environments each')
+
+        n_updates = 0
+        try:
+            while True:
+                # Never block for good on actors that are gone
+                try:
+                    batch = transitions.get(
+                        timeout=self.ACTOR_CHECK_INTERVAL)
+                except queue.Empty:
+                    self.__restart_dead_actors(context, actors, transitions,
+                                               weights)
+                    continue
+
+                loss = agent.learn(*batch)
+                n_updates += 1
+
+                if n_updates % self.broadcast_interval == 0:
+                    weights.publish(agent.get_weights())
+                    self.__restart_dead_actors(context, actors, transitions,
+                                               weights)
+                    log.info(f'Update {n_updates}, loss: {loss}')
+
+                if n_updates % self.save_interval == 0:
+                    agent.save()
+        finally:
+            for actor in actors:
+                if actor.is_alive():
+                    actor.terminate()
+                actor.join()
+
+
+def __main():
+    parser = argparse.ArgumentParser(
+        description='Train online with separate actor and learner processes.'
+    )
+    parser.add_argument('--dolphin-bin', dest='dolphin_bin',
+                        help='Path to Dolphin binary')
+    parser.add_argument('--game-iso', dest='game_iso',
+                        help='Path to game ISO file')
+    parser.add_argument('--actors', dest='n_actors', type=int, default=2,
+                        help='Number of actor processes')
+    parser.add_argument('--envs-per-actor', dest='envs_per_actor', type=int,
+                        default=1, help='Dolphin instances per actor')
+    parser.add_argument('--work-dir', dest='work_dir', default='./envs',
+                        help='Folder for the per instance user directories')
+
+    args = parser.parse_args()
+    ActorLearner(Path(args.dolphin_bin), Path(args.game_iso), args.n_actors,
+                 args.envs_per_actor, Path(args.work_dir)).start()
+
+
+if __name__ == "__main__":
+    __main()
@@ -0,0 +1,84 @@
+"""Persistent cache of decoded replays keyed by content hash."""
+
+import hashlib
+import logging
+import os
+from pathlib import Path
+from typing import List, Optional, Text, Tuple
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+Session = Tuple[np.ndarray, np.ndarray]
+
+
+class ReplayCache():
+    """
+    Cache the outcome of decoding a replay file.
+
+    Entries are keyed by the SHA-1 of the replay content and the version of
+    the preprocessing, so renamed files are still hits while edited files and
+    decoder changes are misses. An entry is either the decoded player sessions
+    or the reason the replay was rejected.
+    """
+
+    CHUNK_SIZE = 1 << 20
+
+    def __init__(self, cache_dir: Text, version: int):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.version = version
+
+    def key(self, path: Text) -> Text:
+        digest = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(self.CHUNK_SIZE), b''):
+                digest.update(chunk)
+        return f'{digest.hexdigest()}-v{self.version}'
+
+    def __entry_path(self, key: Text) -> Path:
+        return self.cache_dir / key[:2] / f'{key}.npz'
+
+    def get(self, key: Text) -> Optional[Tuple[List[Session], Text]]:
+        """
+        Look up a cache entry.
+
+        Returns:
+        None on a cache miss; else a tuple of (sessions, rejection reason)
+        where the reason is an empty string for accepted replays
+        """
+        entry_path = self.__entry_path(key)
+        if not entry_path.exists():
+            return None
+
+        try:
+            with np.load(entry_path) as entry:
+                sessions = [(entry[f'observations_{i}'], entry[f'actions_{i}'])
+                            for i in range(int(entry['n_sessions']))]
+                return sessions, str(entry['rejected'])
+        except (IOError, KeyError, ValueError) as e:
+            log.warning(f'Ignoring broken cache entry {entry_path}: {e}')
+            return None
+
+    def put(self, key: Text, sessions: List[Session],
+            rejected: Text = '') -> None:
+        """
+        Store the decoded sessions or the rejection reason of a replay.
+
+        Entries are written to a temporary file first and moved into place so
+        concurrent workers never read a partial entry.
+        """
+        entry_path = self.__entry_path(key)
+        entry_path.parent.mkdir(exist_ok=True)
+
+        arrays = dict(n_sessions=np.array(len(sessions)),
+                      rejected=np.array(rejected))
+        for i, (observations, actions) in enumerate(sessions):
+            arrays[f'observations_{i}'] = observations
+            arrays[f'actions_{i}'] = actions
+
+        tmp_path = entry_path.with_suffix(f'.{os.getpid()}.tmp')
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(str(tmp_path), str(entry_path))
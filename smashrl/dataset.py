@@ -1,22 +1,57 @@
 
+import io
 import logging
 import os
-import pickle
+import struct
 import sys
+from functools import partial
 from multiprocessing import Pool
-from pathlib import Path
 from typing import List, Tuple
 
-from framework.games.ssbm.ssbm_action import SSBMAction
-from framework.games.ssbm.ssbm_observation import Position, SSBMObservation
+import numpy as np
+
+from framework.games.ssbm.ssbm_action import (STATE_CODE_TO_INDEX,
+                                              UNKNOWN_ACTION, SSBMAction,
+                                              button_masks_to_indices,
+                                              logical_to_state_codes)
+from framework.games.ssbm.ssbm_observation import SSBMObservation
+from framework.games.ssbm.ssbm_reward import SimpleSSBMReward
+from framework.reward import Reward
 from slippi import Game
-from slippi.event import Buttons
-from slippi.id import InGameCharacter, Stage
+from slippi.event import Buttons, EventType, Start
+from slippi.id import CSSCharacter, InGameCharacter, Stage
+from slippi.util import EOFError as SlippiEOFError
+from smashrl.cache import ReplayCache
+from smashrl.shards import ShardWriter, Trajectory
 
 VALID_CHARACTERS = {InGameCharacter.FOX}
+VALID_CSS_CHARACTERS = {CSSCharacter.FOX}
 VALID_STAGES = {Stage.BATTLEFIELD, Stage.FINAL_DESTINATION}
 DEFAULT_STOCK = 3
 
+# Bump whenever the decoded output changes to invalidate the replay cache
+PREPROCESS_VERSION = 1
+
+# Reasons a replay is rejected, stored in the replay cache
+REJECTED_STAGE = 'wrong stage'
+REJECTED_PORT_COUNT = 'wrong port count'
+REJECTED_CHARACTER = 'wrong character or corrupt frames'
+REJECTED_UNREADABLE = 'unreadable'
+
+# Every replay starts with the opening of the UBJSON 'raw' element followed by
+# its big-endian int32 length
+RAW_HEADER = b'{U\x03raw[$U#l'
+
+# Raw columns decoded per port: x, y, stocks, damage
+N_PORT_COLUMNS = 4
+
+# Column permutations of the decoded frame state into SSBMObservation layout,
+# one per player perspective
+PERSPECTIVES = (
+    ([0, 1, 4, 5, 2, 6, 3, 7], 'P1'),
+    ([4, 5, 0, 1, 6, 2, 7, 3], 'P2'),
+)
+
 logging.basicConfig(level=logging.DEBUG)
 log = logging.getLogger(__name__)
 
@@ -30,6 +65,11 @@ def is_valid_character(char: InGameCharacter) -> bool:  # noqa
 
 
 def create_action_from_button(logical):
+    index = STATE_CODE_TO_INDEX[logical_to_state_codes([logical])[0]]
+    if index != UNKNOWN_ACTION:
+        return SSBMAction.from_index(index)
+
+    # Not part of the action space, build the raw controller state
     return SSBMAction(
         trigger=logical & Buttons.Logical.TRIGGER_ANALOG,
         cstick_right=logical & Buttons.Logical.CSTICK_RIGHT,
@@ -50,132 +90,339 @@ def create_action_from_button(logical):
     )
 
 
-def format_training_data(game: Game) -> List[List[
-        Tuple[SSBMObservation, SSBMAction]]]:
-    """
-    Grab a bunch of games and split out each game into training format.
+def _parse_game_start(f, path: str) -> Start:
+    if f.read(len(RAW_HEADER) + 4)[:len(RAW_HEADER)] != RAW_HEADER:
+        raise ValueError(f'{path} is not a Slippi replay')
 
-    Each frame in the game is turned into an observation and action tuple that
-    can be used to 'replay' a game and train an agent. Note that if both
-    players in the game are of the correct character they will both be added
-    as separate training sessions.
+    code, size = f.read(2)
+    if code != EventType.EVENT_PAYLOADS:
+        raise ValueError(f'Expected event payloads, got 0x{code:02x}')
 
-    NOTE: Only formats games that have valid characters and a valid stage.
+    payload = f.read(size - 1)
+    payload_sizes = {
+        code: size for code, size in struct.iter_unpack('>BH', payload)
+    }
+
+    code = f.read(1)[0]
+    if code != EventType.GAME_START:
+        raise ValueError(f'Expected game start, got 0x{code:02x}')
+
+    return Start._parse(io.BytesIO(f.read(payload_sizes[code])))
+
+
+def read_game_start(path: str) -> Start:
+    """
+    Read only the game start event of a replay.
+
+    The event payload sizes and the game start event are the first two events
+    of the raw stream, so this never touches any frame data. Raises
+    ValueError for anything that is not a complete game start, including
+    truncated files.
 
     Arguments:
-    game -- A Slippi game
+    path -- Path to a .slp replay
 
     Returns:
-    A list of lists of tuples (SSBMObservation, SSBMAction[Action])
+    The Slippi game start event
+    """
+    with open(path, 'rb') as f:
+        try:
+            return _parse_game_start(f, path)
+        except (IndexError, KeyError, EOFError, SlippiEOFError,
+                struct.error) as e:
+            raise ValueError(f'{path} has a malformed game start: {e!r}') \
+                from e
 
+
+def validate_start(start: Start) -> str:
     """
-    training_data = list()
+    Check stage, port count and characters from the game start event alone.
+
+    Returns:
+    An empty string if the game might be valid; else the reason for
+    rejecting it
+    """
+    if not is_valid_stage(start.stage):
+        return REJECTED_STAGE
+
+    players = [p for p in start.players if p is not None]
+    if len(players) != 2:
+        return REJECTED_PORT_COUNT
+
+    if not any(p.character in VALID_CSS_CHARACTERS for p in players):
+        return REJECTED_CHARACTER
 
+    return ''
+
+
+def validate_game(game: Game) -> str:
+    """
+    Check that a game has a valid stage and exactly two players.
+
+    Returns:
+    An empty string if the game is valid; else the reason for rejecting it
+    """
     if not is_valid_stage(game.start.stage):
         log.info(f'Skipping game... not a valid stage({game.start.stage})')
-        return []
-
-    s1, s2 = list(), list()
+        return REJECTED_STAGE
 
-    valid_slots = [i for i, port in enumerate(game.frames[0].ports) if port is not None]
+    valid_slots = [i for i, port in enumerate(game.frames[0].ports)
+                   if port is not None]
     if len(valid_slots) != 2:
         log.info("Invalid number of players. Skipping...")
+        return REJECTED_PORT_COUNT
+
+    return ''
+
+
+def decode_game(game: Game) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Decode a game into columnar observation and action arrays.
+
+    The frames of the game are walked once, collecting the raw state of both
+    ports into preallocated arrays. Each player perspective is then a column
+    permutation of the same data. Note that if both players in the game are of
+    the correct character they will both be returned as separate training
+    sessions.
+
+    NOTE: Only decodes games that have valid characters and a valid stage.
+
+    Arguments:
+    game -- A Slippi game
+
+    Returns:
+    A list of tuples (observations, actions), where observations is a
+    (n_frames, 8) float32 matrix laid out as SSBMObservation.as_array() and
+    actions is an int16 vector of action indices
+
+    """
+    if validate_game(game):
         return []
 
-    p1_idx = valid_slots[0]
-    p2_idx = valid_slots[1]
+    valid_slots = [i for i, port in enumerate(game.frames[0].ports)
+                   if port is not None]
+    n_frames = len(game.frames)
+    # Per frame: [p1_x, p1_y, p1_stocks, p1_damage, p2_x, ..., p2_damage]
+    state = np.empty((n_frames, 2 * N_PORT_COLUMNS), dtype=np.float32)
+    buttons = np.empty((n_frames, 2), dtype=np.uint32)
+    valid_character = np.empty((n_frames, 2), dtype=bool)
+    decoded = np.ones(n_frames, dtype=bool)
 
     error_frames = 0
 
-    for frame in game.frames:
-
+    for i, frame in enumerate(game.frames):
         try:
-            p1_pre = frame.ports[p1_idx].leader.pre
-            p2_pre = frame.ports[p2_idx].leader.pre
-
-            p1_post = frame.ports[p1_idx].leader.post
-            p2_post = frame.ports[p2_idx].leader.post
+            for j, port_idx in enumerate(valid_slots):
+                pre = frame.ports[port_idx].leader.pre
+                post = frame.ports[port_idx].leader.post
+
+                offset = j * N_PORT_COLUMNS
+                state[i, offset:offset + N_PORT_COLUMNS] = (
+                    pre.position.x, pre.position.y, post.stocks, post.damage)
+                buttons[i, j] = pre.buttons.logical
+                valid_character[i, j] = is_valid_character(post.character)
         except AttributeError as e:
             error_frames += 1
             if error_frames > 10:
                 log.info(f"AttributeError: {e}")
                 return []
+            decoded[i] = False
+
+    state = state[decoded]
+    buttons = buttons[decoded]
+    valid_character = valid_character[decoded]
+
+    training_data = list()
+
+    for j, (columns, name) in enumerate(PERSPECTIVES):
+        rows = valid_character[:, j]
+        if not rows.any():
             continue
 
+        log.info(f'Adding game session for {name}')
+        observations = np.ascontiguousarray(state[rows][:, columns])
+        actions = button_masks_to_indices(buttons[rows, j])
+        training_data.append((observations, actions))
 
-        if is_valid_character(p1_post.character):
-            p1_obs = SSBMObservation(Position(p1_pre.position.x,
-                                              p1_pre.position.y),
-                                     Position(p2_pre.position.x,
-                                              p2_pre.position.y),
-                                     p1_post.stocks, p2_post.stocks,
-                                     p1_post.damage, p2_post.damage)
-            p1_action = create_action_from_button(p1_pre.buttons.logical)
-            p1_frame_tuple = (p1_obs, p1_action)
-            s1.append(p1_frame_tuple)
-
-        if is_valid_character(p2_post.character):
-            p2_obs = SSBMObservation(Position(p2_pre.position.x,
-                                              p2_pre.position.y),
-                                     Position(p1_pre.position.x,
-                                              p1_pre.position.y),
-                                     p2_post.stocks, p1_post.stocks,
-                                     p2_post.damage, p1_post.damage)
-            p2_action = create_action_from_button(p2_pre.buttons.logical)
-            p2_frame_tuple = (p2_obs, p2_action)
-            s2.append(p2_frame_tuple)
-
-    if s1:
-        log.info('Adding game session for P1')
-        training_data.append(s1)
-
-    if s2:
-        log.info('Adding game session for P2')
-        training_data.append(s2)
-
-    if s1 or s2:
-        winner = 'p1' if frame.ports[p1_idx].leader.post.stocks > 0 else 'p2'
+    if training_data:
+        winner = 'p1' if state[-1, 2] > 0 else 'p2'
         log.info(f'Winner: {winner}')
 
     return training_data
 
 
-def read_game(path: str) -> Game:
-    if not path.endswith('.slp'):
-        return None
+def format_training_data(game: Game) -> List[List[
+        Tuple[SSBMObservation, SSBMAction]]]:
+    """
+    Grab a bunch of games and split out each game into training format.
+
+    Each frame in the game is turned into an observation and action tuple that
+    can be used to 'replay' a game and train an agent. This is a thin wrapper
+    around decode_game, prefer the columnar arrays where possible. Frames
+    whose button state is outside of the action space are skipped, like
+    to_transitions drops them.
+
+    NOTE: Only formats games that have valid characters and a valid stage.
+
+    Arguments:
+    game -- A Slippi game
+
+    Returns:
+    A list of lists of tuples (SSBMObservation, SSBMAction[Action])
+
+    """
+    training_data = list()
+
+    for observations, actions in decode_game(game):
+        session = list()
+        for observation, action in zip(observations, actions.tolist()):
+            if action == UNKNOWN_ACTION:
+                continue
+            session.append((SSBMObservation.from_array(observation),
+                            SSBMAction.from_index(action)))
+        training_data.append(session)
+
+    return training_data
+
+
+def build_trajectory(observations: np.ndarray, actions: np.ndarray,
+                     reward_calculator: Reward) -> Trajectory:
+    """
+    Attach rewards and done flags to a decoded player session.
+
+    The reward and done flag of a frame describe arriving in that frame, so
+    the transition from frame t - 1 to frame t is (observations[t - 1],
+    actions[t - 1], rewards[t], observations[t], done[t]).
+
+    Arguments:
+    observations -- (n_frames, 8) observation matrix from decode_game
+    actions -- Action index vector from decode_game
+    reward_calculator -- A reward class with a batch_cost function
+
+    Returns:
+    Tuple of (observations, actions, rewards, done) arrays
+    """
+    rewards = reward_calculator.batch_cost(observations)
+    done = np.zeros(len(observations), dtype=np.uint8)
+    if len(done) > 0:
+        done[-1] = 1
+
+    return observations, actions, rewards, done
+
+
+def to_transitions(trajectory: Trajectory) -> Tuple[
+        np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Turn a trajectory into transition arrays ready for Agent.learn.
+
+    Transitions taking an action outside of the action space are dropped.
+
+    Returns:
+    Tuple of (observations, observations_next, actions, rewards, done)
+    """
+    observations, actions, rewards, done = trajectory
+    valid = actions[:-1] != UNKNOWN_ACTION
+    return (observations[:-1][valid], observations[1:][valid],
+            actions[:-1][valid], rewards[1:][valid], done[1:][valid])
+
+
+def load_replay(path: str, cache: ReplayCache = None) -> List[
+        Tuple[np.ndarray, np.ndarray]]:
+    """
+    Decode a replay file, going through the replay cache if one is given.
+
+    Replays are first checked against their game start event, which is
+    cheaper than hashing the whole file. Replays that pass are decoded once
+    per preprocessing version, both accepted and rejected outcomes are cached.
+
+    Arguments:
+    path -- Path to a .slp replay
+    cache -- Optional ReplayCache
+
+    Returns:
+    The player sessions of decode_game, empty if the replay was rejected
+    """
+    try:
+        rejected = validate_start(read_game_start(path))
+    except Exception as e:
+        log.info(f"Failed to read game start of {path}: {e}")
+        rejected = REJECTED_UNREADABLE
+
+    if rejected:
+        log.debug(f'Skipping {path}: {rejected}')
+        return []
+
+    key = None
+    if cache is not None:
+        key = cache.key(path)
+        entry = cache.get(key)
+        if entry is not None:
+            sessions, rejected = entry
+            if rejected:
+                log.debug(f'Cached rejection of {path}: {rejected}')
+            return sessions
+
+    sessions = []
     try:
         log.debug(f"Reading in game: {path}")
         game = Game(path)
-        return game if is_valid_stage(game.start.stage) else None
-    except ValueError:
-        pass
+        rejected = validate_game(game)
+        if not rejected:
+            sessions = decode_game(game)
+            rejected = '' if sessions else REJECTED_CHARACTER
+    except Exception as e:
+        log.info(f"Failed to read {path}: {e}")
+        rejected = REJECTED_UNREADABLE
+
+    if cache is not None:
+        cache.put(key, sessions, rejected)
+
+    return sessions
+
+
+def read_trajectories(path: str, reward_calculator: Reward = None,
+                      cache: ReplayCache = None) -> List[Trajectory]:
+    """Read a replay and turn every valid player session into a trajectory."""
+    if reward_calculator is None:
+        reward_calculator = SimpleSSBMReward()
 
+    return [build_trajectory(observations, actions, reward_calculator)
+            for observations, actions in load_replay(path, cache)]
 
-def read_games(folder: str, max_games: int) -> List[Game]:
-    p = Pool(8)
-    files = [os.path.join(folder, x)
-             for x in os.listdir(folder) if x.endswith('.slp')]
+
+def open_cache(folder: str) -> ReplayCache:
+    """Open the replay cache that lives next to the replays in folder."""
+    return ReplayCache(os.path.join(folder, '.cache'), PREPROCESS_VERSION)
+
+
+def list_replays(folder: str, max_games: int = -1) -> List[str]:
+    files = sorted(os.path.join(folder, x)
+                   for x in os.listdir(folder) if x.endswith('.slp'))
     if max_games != -1:
         files = files[0:max_games]
-    games = p.map(read_game, files)
-    p.terminate()
-    p.join()
+    return files
 
-    # filter out bad games
-    games = [g for g in games if g is not None]
 
-    return games
+def dump_to_disk(output: str, files: List[str], cache: ReplayCache = None):
+    """
+    Decode replays and write them as a shard dataset.
+
+    Arguments:
+    output -- Directory to write the shards and index file into
+    files -- Paths of the .slp replays to preprocess
+    cache -- Optional ReplayCache to skip already decoded replays
+    """
+    log.info(f"Preprocessing {len(files)} replays into: {output}")
+    n_games = 0
 
+    with Pool(8) as p, ShardWriter(output) as writer:
+        decoded = p.imap(partial(read_trajectories, cache=cache), files)
+        for path, trajectories in zip(files, decoded):
+            n_games += 1 if trajectories else 0
+            for trajectory in trajectories:
+                writer.append(trajectory, source=os.path.basename(path))
 
-def dump_to_disk(output: str, games: List[Game]):
-    # log.info(f"Collecting training data from: {len(games)} games...")
-    # data = format_training_data(games)
-    # log.info(f"Found: {len(data)} valid games...")
-    # log.info(f"Writing training data to: {output}")
-    log.info(f"Found {len(games)} valid games")
-    Path(os.path.dirname(output)).mkdir(parents=True, exist_ok=True)
-    with open(output, 'wb') as f:
-        pickle.dump(games, f)
+    log.info(f"Found {n_games} valid games")
 
 
 def _main():
@@ -183,8 +430,8 @@ def _main():
     output = sys.argv[2]
     max_games = int(sys.argv[3]) if len(sys.argv) == 4 else -1
 
-    games = read_games(game_folder, max_games)
-    dump_to_disk(output, games)
+    dump_to_disk(output, list_replays(game_folder, max_games),
+                 open_cache(game_folder))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,147 @@
+"""Evaluate a trained agent against recorded replays without an emulator."""
+
+import argparse
+import logging
+from functools import partial
+from multiprocessing import Pool
+from pathlib import Path
+from typing import Iterator, Tuple
+
+import numpy as np
+
+from framework.devices.slippi_replay.slippi_replay import SlippiReplay
+from framework.games.ssbm.ssbm_action import INDEX_TO_BITMASK, UNKNOWN_ACTION
+from smashrl.dataset import list_replays, load_replay, open_cache
+from smashrl.shards import ShardDataset, is_shard_dataset
+from smashrl.ssbm_agent import SSBMAgent
+
+log = logging.getLogger(__name__)
+
+Session = Tuple[np.ndarray, np.ndarray]
+
+
+class Evaluation():
+    """
+    Running totals of an agent evaluated against human play.
+
+    Accuracy is measured on frames where the human action maps to the action
+    space. Q-values are averaged over all frames for the greedy action and
+    over the same frames as the accuracy for the human action.
+    """
+
+    def __init__(self):
+        self.n_sessions = 0
+        self.n_frames = 0
+        self.n_scored = 0
+        self.n_matching = 0
+        self.q_chosen_sum = 0.0
+        self.q_human_sum = 0.0
+
+    @property
+    def accuracy(self) -> float:
+        return self.n_matching / max(1, self.n_scored)
+
+    @property
+    def mean_q_chosen(self) -> float:
+        return self.q_chosen_sum / max(1, self.n_frames)
+
+    @property
+    def mean_q_human(self) -> float:
+        return self.q_human_sum / max(1, self.n_scored)
+
+    def __str__(self):
+        return f'Evaluation(sessions={self.n_sessions}, ' \
+               f'frames={self.n_frames}, accuracy={self.accuracy:.4f}, ' \
+               f'mean_q_chosen={self.mean_q_chosen:.4f}, ' \
+               f'mean_q_human={self.mean_q_human:.4f})'
+
+
+def evaluate_session(agent: SSBMAgent, observations: np.ndarray,
+                     actions: np.ndarray, evaluation: Evaluation) -> None:
+    """
+    Score the greedy actions of the agent on one recorded player session.
+
+    The whole session goes through the network in one batch and the chosen
+    actions are sent through the SlippiReplay device as button states, the
+    same way they would reach Dolphin.
+
+    Arguments:
+    agent -- Agent to evaluate
+    observations -- (n, SSBMObservation.size()) recorded observations
+    actions -- (n,) recorded human action indices
+    evaluation -- Totals to add the session to
+    """
+    device = SlippiReplay(observations, actions)
+    device.launch()
+
+    q_values = agent.q_values(device.observations)
+    chosen = np.argmax(q_values, axis=1)
+    device.set_button_states(INDEX_TO_BITMASK[chosen])
+    n_scored, n_matching = device.score()
+
+    human = np.flatnonzero(device.actions != UNKNOWN_ACTION)
+    evaluation.n_sessions += 1
+    evaluation.n_frames += len(device)
+    evaluation.n_scored += n_scored
+    evaluation.n_matching += n_matching
+    evaluation.q_chosen_sum += float(
+        q_values[np.arange(len(chosen)), chosen].sum())
+    evaluation.q_human_sum += float(
+        q_values[human, device.actions[human]].sum())
+
+
+def read_sessions(folder: str, max_games: int = -1,
+                  n_workers: int = 8) -> Iterator[Session]:
+    """
+    Iterate over the recorded player sessions in a folder.
+
+    The folder is either a shard dataset or a folder of .slp replays, which
+    are decoded in a pool of processes through the replay cache.
+    """
+    if is_shard_dataset(folder):
+        for observations, actions, _, _ in ShardDataset(folder):
+            yield observations, actions
+        return
+
+    files = list_replays(folder, max_games)
+    with Pool(n_workers) as p:
+        for sessions in p.imap(partial(load_replay, cache=open_cache(folder)),
+                               files):
+            yield from sessions
+
+
+def evaluate(agent: SSBMAgent, folder: str, max_games: int = -1,
+             n_workers: int = 8) -> Evaluation:
+    """Evaluate an agent on every player session in a folder."""
+    evaluation = Evaluation()
+    for observations, actions in read_sessions(folder, max_games, n_workers):
+        evaluate_session(agent, observations, actions, evaluation)
+        if evaluation.n_sessions % 100 == 0:
+            log.info(evaluation)
+    return evaluation
+
+
+def _main(replays, checkpoint, max_games=-1, n_workers=8):
+    # SSBMAgent.load falls back to a fresh network, which would score noise
+    if not Path(f'{checkpoint}.index').exists():
+        raise FileNotFoundError(f'No agent checkpoint found at {checkpoint}')
+
+    agent = SSBMAgent(inference_only=True)
+    agent.load(checkpoint)
+    print(evaluate(agent, replays, max_games, n_workers))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Evaluate a trained agent against recorded replays.')
+    parser.add_argument('replays',
+                        help='Folder of .slp replays or a shard dataset')
+    parser.add_argument('--checkpoint', default='./trained_dqn/dqn.ckpt',
+                        help='Agent checkpoint to evaluate')
+    parser.add_argument('--max-games', dest='max_games', type=int,
+                        default=-1, help='Evaluate at most this many replays')
+    parser.add_argument('--workers', dest='n_workers', type=int, default=8,
+                        help='Number of replay decoding processes')
+
+    args = parser.parse_args()
+    _main(args.replays, args.checkpoint, args.max_games, args.n_workers)
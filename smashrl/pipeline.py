@@ -0,0 +1,168 @@
+"""Decode replays in worker processes while the trainer consumes batches."""
+
+import logging
+import queue
+from multiprocessing import Process, Queue, RawArray
+from typing import Iterator, List, Text, Tuple
+
+import numpy as np
+
+from framework.games.ssbm.ssbm_observation import SSBMObservation
+from framework.reward import Reward
+from smashrl.cache import ReplayCache
+from smashrl.dataset import read_trajectories, to_transitions
+
+log = logging.getLogger(__name__)
+
+# Column name -> (dtype, per transition shape), as returned by to_transitions
+COLUMNS = (
+    ('observations', np.dtype(np.float32), (SSBMObservation.size(),)),
+    ('observations_next', np.dtype(np.float32), (SSBMObservation.size(),)),
+    ('actions', np.dtype(np.int16), ()),
+    ('rewards', np.dtype(np.float32), ()),
+    ('done', np.dtype(np.uint8), ()),
+)
+
+Batch = Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+
+
+def _allocate_slot(batch_size: int) -> List[RawArray]:
+    return [RawArray('b', batch_size * int(np.prod(shape)) * dtype.itemsize)
+            for _, dtype, shape in COLUMNS]
+
+
+def _slot_views(slot: List[RawArray], batch_size: int) -> List[np.ndarray]:
+    return [np.frombuffer(raw, dtype=dtype).reshape((batch_size,) + shape)
+            for raw, (_, dtype, shape) in zip(slot, COLUMNS)]
+
+
+def _decode_worker(tasks: Queue, free_slots: Queue, filled_slots: Queue,
+                   slots: List[List[RawArray]], batch_size: int,
+                   reward_calculator: Reward, cache: ReplayCache) -> None:
+    """
+    Decode replays from the task queue into shared memory slots.
+
+    Transitions of consecutive replays are packed into the same slot, a slot
+    is handed to the trainer once it is full. Blocks on the free slot queue
+    whenever the trainer is behind.
+    """
+    views = [_slot_views(slot, batch_size) for slot in slots]
+    slot, filled = None, 0
+
+    for path in iter(tasks.get, None):
+        for trajectory in read_trajectories(path, reward_calculator, cache):
+            transitions = to_transitions(trajectory)
+            n_transitions = len(transitions[2])
+            start = 0
+
+            while start < n_transitions:
+                if slot is None:
+                    slot, filled = free_slots.get(), 0
+
+                n = min(batch_size - filled, n_transitions - start)
+                for view, column in zip(views[slot], transitions):
+                    view[filled:filled + n] = column[start:start + n]
+                filled += n
+                start += n
+
+                if filled == batch_size:
+                    filled_slots.put((slot, filled))
+                    slot = None
+
+    if slot is not None:
+        filled_slots.put((slot, filled))
+    filled_slots.put(None)
+
+
+class TransitionPipeline():
+    """
+    Producer/consumer pipeline from replay files to training batches.
+
+    A pool of worker processes decodes replays and computes rewards straight
+    into a fixed set of shared memory slots. Iterating the pipeline yields
+    zero-copy views of filled slots; a slot is handed back to the workers as
+    soon as the next batch is requested. The number of slots bounds how far
+    the workers can run ahead of the trainer.
+
+    Arguments:
+    files -- Paths of the .slp replays to decode
+    batch_size -- Number of transitions per yielded batch
+    n_workers -- Number of decoding processes
+    n_slots -- Number of shared memory batches, the backpressure limit.
+        With fewer slots than workers the extra workers idle until a slot
+        frees up
+    reward_calculator -- Reward used for the transitions
+    cache -- Optional ReplayCache shared by the workers
+
+    Raises RuntimeError while iterating if a worker dies, its batches and
+    end of work marker would otherwise never arrive.
+    """
+
+    WORKER_CHECK_INTERVAL = 5  # Seconds
+
+    def __init__(self, files: List[Text], batch_size: int = 4096,
+                 n_workers: int = 4, n_slots: int = 8,
+                 reward_calculator: Reward = None,
+                 cache: ReplayCache = None):
+        if n_slots < 1:
+            raise ValueError(f'Need at least one slot, got {n_slots}')
+        self.files = files
+        self.batch_size = batch_size
+        self.n_workers = max(1, min(n_workers, len(files)))
+        self.n_slots = n_slots
+        self.reward_calculator = reward_calculator
+        self.cache = cache
+
+    @staticmethod
+    def __check_workers(workers: List[Process]) -> None:
+        for i, worker in enumerate(workers):
+            if worker.exitcode not in (None, 0):
+                raise RuntimeError(f'Decoding worker {i} exited with code '
+                                   f'{worker.exitcode}')
+
+    def __iter__(self) -> Iterator[Batch]:
+        slots = [_allocate_slot(self.batch_size)
+                 for _ in range(self.n_slots)]
+        views = [_slot_views(slot, self.batch_size) for slot in slots]
+
+        tasks, free_slots, filled_slots = Queue(), Queue(), Queue()
+        for path in self.files:
+            tasks.put(path)
+        for _ in range(self.n_workers):
+            tasks.put(None)
+        for slot in range(self.n_slots):
+            free_slots.put(slot)
+
+        workers = [Process(target=_decode_worker,
+                           args=(tasks, free_slots, filled_slots, slots,
+                                 self.batch_size, self.reward_calculator,
+                                 self.cache),
+                           daemon=True)
+                   for _ in range(self.n_workers)]
+        for worker in workers:
+            worker.start()
+        log.info(f'Started {self.n_workers} decoding workers for '
+                 f'{len(self.files)} replays')
+
+        try:
+            finished = 0
+            while finished < self.n_workers:
+                try:
+                    message = filled_slots.get(
+                        timeout=self.WORKER_CHECK_INTERVAL)
+                except queue.Empty:
+                    self.__check_workers(workers)
+                    continue
+
+                if message is None:
+                    finished += 1
+                    continue
+
+                slot, n = message
+                yield tuple(view[:n] for view in views[slot])
+                free_slots.put(slot)
+        finally:
+            for worker in workers:
+                if worker.is_alive():
+                    worker.terminate()
+                worker.join()
@@ -25,13 +25,16 @@ class Session():
             iso_path=Path(args.game_iso),
             memory_mapping=Path(
                 "./framework/devices/dolphin/config/Locations.txt"),
-            render=True
+            render=not args.headless,
+            emulation_speed=args.emulation_speed,
+            blocking_input=args.frames_per_step is not None
         )
         self.game = SSBMGame(
             self.device, [self.agent], self.SAMPLING_WINDOW,
-            stats_file='stats.json')
+            stats_file='stats.jsonl')
         self.game_session = GameSession(
-            self.agent, self.device, self.game, SSBMDolphinBuilder())
+            self.agent, self.device, self.game, SSBMDolphinBuilder(),
+            frames_per_step=args.frames_per_step)
 
         self.game_session.start()
 
@@ -60,6 +63,17 @@ def __main():
                         help='Path to Dolphin binary')
     parser.add_argument('--game-iso', dest='game_iso',
                         help='Path to game ISO file')
+    parser.add_argument('--frames-per-step', dest='frames_per_step',
+                        type=int, default=None,
+                        help='Step the agent every N emulator frames in '
+                             'lockstep with a blocking emulator instead of '
+                             'by wall-clock time')
+    parser.add_argument('--emulation-speed', dest='emulation_speed',
+                        type=float, default=1.0,
+                        help='Multiple of real-time speed, 0 runs '
+                             'unthrottled. Needs --frames-per-step unless 1')
+    parser.add_argument('--headless', action='store_true',
+                        help='Use the Null renderer')
 
     args = parser.parse_args()
     Session(args)
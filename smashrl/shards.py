@@ -0,0 +1,185 @@
+"""Preprocessed replay dataset stored as memory-mapped binary shards."""
+
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Iterator, List, Text, Tuple
+
+import numpy as np
+
+from framework.games.ssbm.ssbm_observation import SSBMObservation
+
+log = logging.getLogger(__name__)
+
+SHARD_FORMAT_VERSION = 1
+INDEX_FILE = 'index.json'
+
+# Column name -> (dtype, per frame shape)
+COLUMNS = (
+    ('observations', np.dtype('<f4'), (SSBMObservation.size(),)),
+    ('actions', np.dtype('<i2'), ()),
+    ('rewards', np.dtype('<f4'), ()),
+    ('done', np.dtype('u1'), ()),
+)
+
+Trajectory = Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+
+
+def is_shard_dataset(path: Text) -> bool:  # noqa
+    return os.path.isfile(os.path.join(path, INDEX_FILE))
+
+
+def _column_file(shard_name: Text, column: Text) -> Text:
+    return f'{shard_name}.{column}.bin'
+
+
+class ShardWriter():
+    """
+    Write trajectories into fixed-layout binary shards.
+
+    Every column of a shard is a raw little-endian file that can be memory
+    mapped directly. A trajectory is never split across shards, a new shard
+    is started once the current one holds frames_per_shard frames. The
+    index file marks the dataset as complete, it is only written once all
+    trajectories were appended without an error.
+    """
+
+    def __init__(self, output_dir: Text, frames_per_shard: int = 1000000):
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        # An old index would describe shards this writer is overwriting
+        try:
+            (self.output_dir / INDEX_FILE).unlink()
+        except FileNotFoundError:
+            pass
+        self.frames_per_shard = frames_per_shard
+        self.shards = []  # type: List[dict]
+        self.trajectories = []  # type: List[dict]
+        self.files = None
+
+    def __open_shard(self):
+        self.__close_shard()
+        name = f'shard-{len(self.shards):05d}'
+        self.files = {
+            column: open(self.output_dir / _column_file(name, column), 'wb')
+            for column, _, _ in COLUMNS
+        }
+        self.shards.append(dict(name=name, n_frames=0))
+
+    def __close_shard(self):
+        if self.files is None:
+            return
+
+        for f in self.files.values():
+            f.close()
+        self.files = None
+
+    def append(self, trajectory: Trajectory, source: Text = '') -> None:
+        """
+        Append a single trajectory to the dataset.
+
+        Arguments:
+        trajectory -- Tuple of (observations, actions, rewards, done) arrays,
+            one row per frame
+        source -- Name of the replay the trajectory was decoded from
+        """
+        n_frames = len(trajectory[0])
+        if n_frames == 0:
+            return
+
+        if self.files is None or (
+                self.shards[-1]['n_frames'] > 0 and
+                self.shards[-1]['n_frames'] + n_frames >
+                self.frames_per_shard):
+            self.__open_shard()
+
+        shard = self.shards[-1]
+        for (column, dtype, shape), values in zip(COLUMNS, trajectory):
+            values = np.ascontiguousarray(values, dtype=dtype)
+            assert values.shape == (n_frames,) + shape, \
+                f'Column {column} has shape {values.shape}'
+            self.files[column].write(values.tobytes())
+
+        self.trajectories.append(dict(shard=len(self.shards) - 1,
+                                      offset=shard['n_frames'],
+                                      length=n_frames,
+                                      source=source))
+        shard['n_frames'] += n_frames
+
+    def close(self) -> None:
+        """Flush all shards and write the index file."""
+        self.__close_shard()
+        index = dict(
+            version=SHARD_FORMAT_VERSION,
+            columns=[dict(name=column, dtype=dtype.str, shape=list(shape))
+                     for column, dtype, shape in COLUMNS],
+            shards=self.shards,
+            trajectories=self.trajectories)
+
+        with open(self.output_dir / INDEX_FILE, 'w') as f:
+            json.dump(index, f)
+
+        log.info(f'Wrote {len(self.trajectories)} trajectories into '
+                 f'{len(self.shards)} shards in {self.output_dir}')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            # Leave the partial dataset without an index
+            self.__close_shard()
+
+
+class ShardDataset():
+    """
+    Read-only view of a shard dataset.
+
+    All columns are opened with np.memmap, trajectories are returned as
+    slices of the mapped files so nothing is read until it is used.
+    """
+
+    def __init__(self, path: Text):
+        self.path = Path(path)
+        with open(self.path / INDEX_FILE) as f:
+            index = json.load(f)
+
+        if index['version'] != SHARD_FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported shard format version {index['version']} in "
+                f"{self.path}, re-run the preprocessing")
+
+        self.trajectories = index['trajectories']
+        self.shards = [self.__map_shard(shard, index['columns'])
+                       for shard in index['shards']]
+
+    def __map_shard(self, shard: dict, columns: List[dict]):
+        if shard['n_frames'] == 0:
+            return None
+
+        return [np.memmap(self.path / _column_file(shard['name'],
+                                                   column['name']),
+                          dtype=np.dtype(column['dtype']), mode='r',
+                          shape=(shard['n_frames'],) + tuple(column['shape']))
+                for column in columns]
+
+    @property
+    def n_frames(self) -> int:
+        return sum(t['length'] for t in self.trajectories)
+
+    def __len__(self) -> int:
+        return len(self.trajectories)
+
+    def __getitem__(self, index: int) -> Trajectory:
+        entry = self.trajectories[index]
+        start = entry['offset']
+        end = start + entry['length']
+        return tuple(column[start:end]
+                     for column in self.shards[entry['shard']])
+
+    def __iter__(self) -> Iterator[Trajectory]:
+        for i in range(len(self)):
+            yield self[i]
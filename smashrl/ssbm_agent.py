@@ -3,11 +3,13 @@
 import logging
 import os
 from pathlib import Path
+from typing import List
 
 import numpy as np
 
 from algorithms.dqn_v2.dqn import DQNv2
 from algorithms.e_greedy.e_greedy import EGreedy
+from algorithms.replay_buffer.replay_buffer import ReplayBuffer
 from framework.agent import Agent
 from framework.games.ssbm.ssbm_action import SSBMAction
 from framework.games.ssbm.ssbm_action_space import SSBMActionSpace
@@ -19,7 +21,7 @@ log = logging.getLogger(__name__)
 class SSBMAgent(Agent):
     """DQNetwork implementation for SSBM."""
 
-    def __init__(self, inference_only=False):
+    def __init__(self, inference_only=False, memory: ReplayBuffer = None):
         super().__init__(SSBMActionSpace())
         self.inference_only = inference_only
         self.q = DQNv2(
@@ -27,31 +29,69 @@ class SSBMAgent(Agent):
             action_size=self.action_space.n_actions,
             learning_rate=0.001,
             gamma=0.95,
-            batch_size=1
+            batch_size=32,
+            memory=memory
         )
-        self.e_greedy = EGreedy()
+        self.epsilon = 1.0
+        self.e_greedy = EGreedy(metrics_hook=self.__record_epsilon)
+
+    def __record_epsilon(self, epsilons: np.ndarray) -> None:
+        self.epsilon = float(np.mean(epsilons))
 
     def act(self, observation: SSBMObservation, timestep: int) -> SSBMAction:
         if not self.inference_only and self.e_greedy.predict(timestep):
             return self.action_space.random_action()
 
-        actions = self.q.predict(observation.as_array())
-        return actions[0]
-
-    # TODO: Update learn to take in lists of everything for proper batching
-    def learn(self, observation: SSBMObservation,
-              observation_next: SSBMObservation, action: SSBMAction,
-              reward: float, done: float):
-
-        batched_observations = [observation]
-        batched_observations_next = [observation_next]
-        batched_actions = [action]
-
-        observations = [o.as_array() for o in batched_observations]
-        observations_next = [o.as_array() for o in batched_observations_next]
-
-        return self.q.train(
-            observations, observations_next, [action.as_index()], [reward], [done])
+        index = self.q.predict(observation.as_array()[np.newaxis])
+        return self.action_space.action_to_index(index)
+
+    def act_batch(self, observations: np.ndarray,
+                  timesteps: np.ndarray) -> List[SSBMAction]:
+        """
+        Pick actions for a batch of environments with one forward pass.
+
+        Arguments:
+        observations -- (n, SSBMObservation.size()) observation arrays
+        timesteps -- (n,) exploration timestep of every environment
+
+        Returns:
+        One action per observation
+        """
+        indices = self.q.predict_batch(observations)
+        if not self.inference_only:
+            explore = self.e_greedy.predict_batch(timesteps)
+            indices = np.where(explore,
+                               self.action_space.random_indices(len(indices)),
+                               indices)
+        return [self.action_space.action_to_index(i) for i in indices]
+
+    def q_values(self, observations: np.ndarray) -> np.ndarray:
+        return self.q.q_values(observations)
+
+    def learn(self, observations: np.ndarray, observations_next: np.ndarray,
+              actions: np.ndarray, rewards: np.ndarray,
+              done: np.ndarray) -> float:
+        """
+        Train on a batch of transitions.
+
+        Arguments:
+        observations -- (n, SSBMObservation.size()) observation arrays
+        observations_next -- (n, SSBMObservation.size()) resulting observations
+        actions -- (n,) action indices taken in observations
+        rewards -- (n,) rewards for reaching observations_next
+        done -- (n,) 1.0 where observations_next ended the game; else 0.0
+
+        Returns:
+        Average training loss
+        """
+        return self.q.train(observations, observations_next, actions,
+                            rewards, done)
+
+    def get_weights(self) -> List[np.ndarray]:
+        return self.q.get_weights()
+
+    def set_weights(self, weights: List[np.ndarray]) -> None:
+        self.q.set_weights(weights)
 
     def load(self, path='./trained_dqn/dqn.ckpt'):
         if not Path(os.path.dirname(path)).exists():
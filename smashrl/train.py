@@ -1,37 +1,54 @@
 """Handle data formatting from replays and offline training of the Agent."""
 
+import argparse
 import logging
-import os
-import sys
-from typing import List
+from typing import Iterable, Iterator, List, Tuple
 
 import numpy as np
 
 from framework.agent import Agent
 from framework.games.ssbm.ssbm_reward import SimpleSSBMReward
 from framework.reward import Reward
-from slippi import Game
-from smashrl.dataset import format_training_data
+from smashrl.dataset import (list_replays, open_cache, read_trajectories,
+                             to_transitions)
+from smashrl.pipeline import TransitionPipeline
+from smashrl.shards import ShardDataset, Trajectory, is_shard_dataset
 from smashrl.ssbm_agent import SSBMAgent
 
 log = logging.getLogger(__name__)
 
+# Number of transitions handed to the agent per learn call
+TRAINING_CHUNK = 1000
 
-def read_games(folder: str):
-    files = [os.path.join(folder, x)
-             for x in os.listdir(folder) if x.endswith('.slp')]
 
+def read_games(folder: str, reward_calculator: Reward = None) -> Iterator[
+        Tuple[int, List[Trajectory]]]:
+    """
+    Iterate over the games in a training data folder.
+
+    The folder is either a shard dataset written by smashrl.dataset, which is
+    memory mapped, or a folder of raw .slp replays that are decoded on the
+    fly through the replay cache.
+
+    Yields:
+    Tuples of (number of games, trajectories of a single game)
+    """
+    if is_shard_dataset(folder):
+        dataset = ShardDataset(folder)
+        log.info(f'Loaded shard dataset with {dataset.n_frames} frames')
+        for trajectory in dataset:
+            yield len(dataset), [trajectory]
+        return
+
+    files = list_replays(folder)
+    cache = open_cache(folder)
     for game in files:
-        try:
-            yield len(files), Game(game)
-        except Exception:
-            yield len(files), None
+        yield len(files), read_trajectories(game, reward_calculator, cache)
 
 
 def run_offline_training_sequence(
         agent: Agent,
-        reward_calculator: Reward,
-        games: List[Game],
+        games: Iterable[Tuple[int, List[Trajectory]]],
         per_game_iteration: int = 1) -> None:
     """
     Run a training sequence of a set of games.
@@ -41,70 +58,100 @@ def run_offline_training_sequence(
 
     Arguments:
     agent -- The RL Agent object to train
-    reward -- A reward class with a cost function
-    games -- A list of Slippi game objects to use for training
+    games -- Iterable of (number of games, trajectories) as from read_games
     """
 
     log.info('Starting training sequence')
-    log.info('Formatting data')
 
-    for game_idx, (max_g, unformatted_game) in enumerate(games):
+    for game_idx, (max_g, trajectories) in enumerate(games):
 
-        if unformatted_game is None:
+        if not trajectories:
             continue
 
-        formatted_games = format_training_data(unformatted_game)
-
         for game_iteration in range(per_game_iteration):
             log.info(
                 f"Training on game: {game_idx + 1}/{max_g}, "
                 f"iteration: {game_iteration + 1}/{per_game_iteration}")
 
-            for game in formatted_games:
+            for observations, actions, rewards, done in trajectories:
 
-                obs, action = game[0]
-                observations = [obs]
+                transitions = to_transitions(
+                    (observations, actions, rewards, done))
                 losses = []
-                rewards = []
 
-                for ts, (new_obs, next_action) in enumerate(game):
-
-                    reward = reward_calculator.cost(new_obs, observations, ts)
-                    rewards.append(reward)
-                    done = float(ts == (len(game) - 1))
-
-                    loss = agent.learn(obs, new_obs, action, reward, done)
+                for ts in range(0, len(transitions[2]), TRAINING_CHUNK):
+                    chunk = [column[ts:ts + TRAINING_CHUNK]
+                             for column in transitions]
+                    loss = agent.learn(*chunk)
                     losses.append(loss)
 
-                    if ts % 1000 == 0:
-                        log.info(f"TS: {ts}, Loss: {loss}, "
-                                 f"Avg Reward: {np.average(rewards)}")
-
-                    obs, action = new_obs, next_action
+                    log.info(f"TS: {ts}, Loss: {loss}, "
+                             f"Avg Reward: {np.average(chunk[3])}")
 
                 log.info("Training summary:")
                 log.info(f"Average loss: {np.average(losses)}")
                 log.info(f"Average reward: {np.average(rewards)}")
-                log.info(f"Total TS: {len(game)}")
+                log.info(f"Total TS: {len(actions)}")
                 log.info("=====================")
 
         agent.save()
 
 
-def _main(training_data):
-    dataset = read_games(training_data)
+def run_pipelined_training_sequence(
+        agent: Agent, pipeline: TransitionPipeline,
+        save_interval: int = 100) -> None:
+    """
+    Train on batches decoded in the background by a TransitionPipeline.
+
+    Arguments:
+    agent -- The RL Agent object to train
+    pipeline -- Pipeline yielding batches of transitions
+    save_interval -- Number of batches between agent checkpoints
+    """
+    log.info('Starting pipelined training sequence')
+    losses = []
+
+    for batch_idx, batch in enumerate(pipeline):
+        losses.append(agent.learn(*batch))
 
+        if (batch_idx + 1) % save_interval == 0:
+            log.info(f"Batch: {batch_idx + 1}, "
+                     f"Average loss: {np.average(losses)}")
+            losses = []
+            agent.save()
+
+
+def _main(training_data, n_workers=4, queue_size=8):
+    reward = SimpleSSBMReward()
     agent = SSBMAgent()
 
     # TODO: Load pre-trained model
     # agent.load()
 
-    reward = SimpleSSBMReward()
-    run_offline_training_sequence(
-        agent, reward, dataset, per_game_iteration=1)
+    if is_shard_dataset(training_data):
+        dataset = read_games(training_data, reward)
+        run_offline_training_sequence(agent, dataset, per_game_iteration=1)
+    else:
+        pipeline = TransitionPipeline(
+            list_replays(training_data), batch_size=TRAINING_CHUNK,
+            n_workers=n_workers, n_slots=queue_size,
+            reward_calculator=reward, cache=open_cache(training_data))
+        run_pipelined_training_sequence(agent, pipeline)
 
     agent.save()
 
 
 if __name__ == "__main__":
-    _main(sys.argv[1])
+    parser = argparse.ArgumentParser(
+        description='Train the agent offline on replays.')
+    parser.add_argument('training_data',
+                        help='Folder of .slp replays or a shard dataset')
+    parser.add_argument('--workers', dest='n_workers', type=int, default=4,
+                        help='Number of replay decoding processes')
+    parser.add_argument('--queue-size', dest='queue_size', type=int,
+                        default=8,
+                        help='Number of decoded batches that may be waiting '
+                             'for the trainer')
+
+    args = parser.parse_args()
+    _main(args.training_data, args.n_workers, args.queue_size)
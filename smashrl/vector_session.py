@@ -0,0 +1,202 @@
+"""Run many headless Dolphin environments against one agent."""
+
+import argparse
+import logging
+import os
+import selectors
+import threading
+import time
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+from framework.agent import Agent
+from framework.devices.dolphin.dolphin import Dolphin
+from framework.games.ssbm.ssbm import SSBMGame
+from framework.games.ssbm.ssbm_observation import SSBMObservation
+from framework.state_builders import SSBMDolphinBuilder
+from smashrl.ssbm_agent import SSBMAgent
+
+log = logging.getLogger(__name__)
+
+MEMORY_MAPPING = Path('./framework/devices/dolphin/config/Locations.txt')
+
+
+class VectorSession():
+    """
+    Vector environment of N Dolphin instances sharing one agent.
+
+    Every instance runs with the Null renderer in its own user directory, so
+    pipes, MemoryWatcher sockets and configs never collide. Each environment
+    has its own thread that launches the device, reads its MemoryWatcher
+    socket and runs the menu navigation and stale device restarts, which
+    block for seconds. The main thread is the only one using the agent: on
+    every sampling tick the observations of all environments that are in a
+    game are copied into one array and the agent picks their actions with a
+    single forward pass. Environments busy in a blocking menu step are
+    skipped for that tick. Checkpoints requested by finished games are also
+    written there.
+
+    Arguments:
+    agent -- Agent acting in every environment
+    executable_path -- Path to the Dolphin binary
+    iso_path -- Path to the game ISO
+    n_envs -- Number of Dolphin instances
+    work_dir -- Folder holding one user directory per instance
+    """
+
+    SAMPLING_WINDOW = 1.0/15.0  # Seconds
+    STALE_OBSERVATION_TIMEOUT = 20  # Seconds
+
+    def __init__(self, agent: Agent, executable_path: Path, iso_path: Path,
+                 n_envs: int, work_dir: Path,
+                 memory_mapping: Path = MEMORY_MAPPING):
+        self.agent = agent
+        self.n_envs = n_envs
+        work_dir = Path(work_dir)
+        # Games finish on the environment threads, the agent is only saved
+        # on the main thread that acts and learns with it
+        self.save_requested = threading.Event()
+
+        self.devices = [
+            Dolphin(executable_path=executable_path, iso_path=iso_path,
+                    memory_mapping=memory_mapping, render=False,
+                    user_dir=work_dir / f'dolphin-{i}')
+            for i in range(n_envs)]
+        self.games = [
+            SSBMGame(device, [agent], self.SAMPLING_WINDOW,
+                     stats_file=str(work_dir / f'stats-{i}.jsonl'),
+                     save_callback=self.save_requested.set)
+            for i, device in enumerate(self.devices)]
+        self.builders = [SSBMDolphinBuilder() for _ in range(n_envs)]
+
+        # Guards the game, builder and latest observation of an environment
+        self.locks = [threading.Lock() for _ in range(n_envs)]
+        self.game_updates = [None] * n_envs
+        self.stopped = threading.Event()
+
+        self.observations = np.zeros((n_envs, SSBMObservation.size()),
+                                     dtype=np.float32)
+        self.timesteps = np.zeros(n_envs, dtype=np.int64)
+
+    def __run_environment(self, i: int) -> None:
+        """Feed device updates of one environment into its game."""
+        device, game, builder = self.devices[i], self.games[i], \
+            self.builders[i]
+        device.launch()
+
+        selector = selectors.DefaultSelector()
+        selector.register(device, selectors.EVENT_READ)
+        last_meta_update = time.time()
+
+        while not self.stopped.is_set():
+            stale_deadline = last_meta_update + \
+                self.STALE_OBSERVATION_TIMEOUT
+            ready = selector.select(max(0.0, stale_deadline - time.time()))
+
+            with self.locks[i]:
+                if ready:
+                    meta_update, self.game_updates[i] = builder.transform(
+                        device.read_state())
+
+                    # Menu navigation sleeps, only this environment waits
+                    if meta_update is not None:
+                        game.meta_update(meta_update)
+                        last_meta_update = time.time()
+
+                # A meta update read in this iteration moves the deadline
+                if time.time() > last_meta_update + \
+                        self.STALE_OBSERVATION_TIMEOUT:
+                    log.warning(f'Stale device {i} detected. '
+                                'Restarting device...')
+                    device.restart()
+                    game.hard_reset()
+                    self.game_updates[i] = None
+                    last_meta_update = time.time()
+
+    def __step(self) -> None:
+        """Act in every environment that is in a game."""
+        if self.save_requested.is_set():
+            self.save_requested.clear()
+            self.agent.save()
+
+        ready = []
+        try:
+            for i, lock in enumerate(self.locks):
+                # Skip environments blocked in menus or restarts
+                if not lock.acquire(blocking=False):
+                    continue
+                observation = self.game_updates[i]
+                if observation is None or \
+                        not self.games[i].wants_action(observation):
+                    lock.release()
+                    continue
+
+                self.observations[len(ready)] = observation.as_array()
+                self.timesteps[len(ready)] = self.games[i].n_games
+                ready.append(i)
+
+            if not ready:
+                return
+
+            n = len(ready)
+            start = time.perf_counter()
+            actions = self.agent.act_batch(self.observations[:n],
+                                           self.timesteps[:n])
+            act_seconds = (time.perf_counter() - start) / n
+
+            for i, action in zip(ready, actions):
+                game, observation = self.games[i], self.game_updates[i]
+                game.episode.act_seconds += act_seconds
+                game.apply_action(self.agent, observation, action)
+                game.record_observation(observation)
+        finally:
+            for i in ready:
+                self.locks[i].release()
+
+    def start(self):
+        # Devices launch concurrently, every launch waits for Dolphin to boot
+        threads = [threading.Thread(target=self.__run_environment, args=(i,),
+                                    name=f'dolphin-{i}', daemon=True)
+                   for i in range(self.n_envs)]
+        for thread in threads:
+            thread.start()
+
+        next_sample = time.time()
+        while not self.stopped.is_set():
+            next_sample += self.SAMPLING_WINDOW
+            self.__step()
+            # Skip ticks that were missed instead of bursting to catch up
+            next_sample = max(next_sample, time.time())
+            time.sleep(max(0.0, next_sample - time.time()))
+
+    def stop(self):
+        self.stopped.set()
+
+
+def __main():
+    parser = argparse.ArgumentParser(
+        description='Launch several headless Dolphins sharing one agent.'
+    )
+    parser.add_argument('--dolphin-bin', dest='dolphin_bin',
+                        help='Path to Dolphin binary')
+    parser.add_argument('--game-iso', dest='game_iso',
+                        help='Path to game ISO file')
+    parser.add_argument('--envs', dest='n_envs', type=int,
+                        default=max(1, (os.cpu_count() or 2) // 2),
+                        help='Number of Dolphin instances, defaults to one '
+                             'per two cores')
+    parser.add_argument('--work-dir', dest='work_dir', default='./envs',
+                        help='Folder for the per instance user directories')
+
+    args = parser.parse_args()
+
+    agent = SSBMAgent(inference_only=False)
+    agent.load()
+    VectorSession(agent, Path(args.dolphin_bin), Path(args.game_iso),
+                  args.n_envs, Path(args.work_dir)).start()
+
+
+if __name__ == "__main__":
+    __main()
@@ -0,0 +1,62 @@
+import numpy as np
+
+from algorithms.replay_buffer.prioritized_replay_buffer import (
+    PrioritizedReplayBuffer, SumTree)
+
+OBSERVATION_SIZE = 3
+
+
+def _filled_buffer(capacity: int, n: int, **kwargs) -> \
+        PrioritizedReplayBuffer:
+    memory = PrioritizedReplayBuffer(capacity, OBSERVATION_SIZE, **kwargs)
+    memory.add(np.zeros((n, OBSERVATION_SIZE)), np.zeros(n), np.zeros(n),
+               np.zeros((n, OBSERVATION_SIZE)), np.zeros(n))
+    return memory
+
+
+def test_sum_tree_total_with_duplicate_indices():
+    tree = SumTree(10)
+    tree.update(np.arange(10), np.ones(10))
+    # The last write to a duplicated leaf wins
+    tree.update(np.array([3, 3, 7, 3]), np.array([5.0, 6.0, 2.0, 4.0]))
+
+    expected = np.ones(10)
+    expected[3], expected[7] = 4.0, 2.0
+    np.testing.assert_allclose(tree.get(np.arange(10)), expected)
+    assert np.isclose(tree.total, expected.sum())
+
+
+def test_sampling_follows_priorities():
+    np.random.seed(0)
+    memory = _filled_buffer(4, 4, alpha=1.0, epsilon=0.0)
+    td_errors = np.array([1.0, 2.0, 3.0, 4.0])
+    memory.update_priorities(np.arange(4), td_errors)
+
+    indices = np.concatenate([memory.sample_indices(32)
+                              for _ in range(1000)])
+    frequencies = np.bincount(indices, minlength=4) / len(indices)
+    np.testing.assert_allclose(frequencies, td_errors / td_errors.sum(),
+                               atol=0.01)
+
+
+def test_sampled_indices_stay_within_size(monkeypatch):
+    memory = _filled_buffer(100, 3)
+    # Round-off pushes the last draw just past the total priority mass
+    monkeypatch.setattr(np.random, 'rand', lambda n: np.full(n, 1.0 + 1e-9))
+
+    indices = memory.sample_indices(8)
+    assert indices.max() < memory.size
+    assert indices.min() >= 0
+
+
+def test_importance_weights_at_most_one():
+    np.random.seed(0)
+    memory = _filled_buffer(64, 50)
+    memory.update_priorities(np.arange(50), np.random.rand(50) * 10)
+
+    indices = memory.sample_indices(32)
+    weights = memory.importance_weights(indices)
+    assert weights.dtype == np.float32
+    assert np.all(weights > 0)
+    assert np.all(weights <= 1.0)
+    assert np.isclose(weights.max(), 1.0)
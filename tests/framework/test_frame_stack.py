@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from framework.frame_stack import FrameStack, stack
+
+OBSERVATION_SIZE = 3
+
+
+def _observations(n: int) -> np.ndarray:
+    return np.random.RandomState(n).rand(n, OBSERVATION_SIZE) \
+        .astype(np.float32)
+
+
+@pytest.mark.parametrize('k', [1, 2, 4])
+@pytest.mark.parametrize('velocities', [True, False])
+def test_push_matches_stack(k, velocities):
+    observations = _observations(10)
+    expected = stack(observations, k, velocities)
+    frames = FrameStack(k, OBSERVATION_SIZE, velocities)
+    assert expected.shape == (len(observations), frames.size)
+
+    for t, observation in enumerate(observations):
+        np.testing.assert_allclose(frames.push(observation), expected[t],
+                                   atol=1e-6)
+        np.testing.assert_array_equal(frames.frame(-1), observation)
+
+
+def test_reset_starts_a_new_trajectory():
+    frames = FrameStack(3, OBSERVATION_SIZE)
+    for observation in _observations(5):
+        frames.push(observation)
+
+    frames.reset()
+    observations = _observations(4)
+    expected = stack(observations, 3)
+    for t, observation in enumerate(observations):
+        np.testing.assert_allclose(frames.push(observation), expected[t],
+                                   atol=1e-6)
+
+
+def test_frame_history():
+    observations = _observations(6)
+    frames = FrameStack(4, OBSERVATION_SIZE)
+    for observation in observations:
+        frames.push(observation)
+
+    for index in range(-4, 0):
+        np.testing.assert_array_equal(frames.frame(index),
+                                      observations[index])
+
+
+def test_stack_empty_trajectory():
+    assert stack(np.zeros((0, OBSERVATION_SIZE)), 2).shape == \
+        (0, 2 * 2 * OBSERVATION_SIZE)
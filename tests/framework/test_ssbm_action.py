@@ -0,0 +1,35 @@
+import numpy as np
+from slippi.event import Buttons
+
+from framework.games.ssbm.ssbm_action import (INDEX_TO_BITMASK, N_ACTIONS,
+                                              N_LOGICAL_INPUTS,
+                                              STATE_CODE_TO_INDEX,
+                                              STATE_TO_INDEX_LOOKUP,
+                                              STATE_TO_SLIPPI, UNKNOWN_ACTION,
+                                              button_masks_to_indices,
+                                              simplify_action)
+
+
+def test_state_code_table_matches_simplify_action():
+    assert len(STATE_CODE_TO_INDEX) == 1 << N_LOGICAL_INPUTS
+
+    for code in range(1 << N_LOGICAL_INPUTS):
+        state = [(code >> bit) & 1 for bit in range(N_LOGICAL_INPUTS)]
+        expected = STATE_TO_INDEX_LOOKUP.get(
+            tuple(simplify_action(state)), UNKNOWN_ACTION)
+        assert STATE_CODE_TO_INDEX[code] == expected, \
+            f'State code {code:#06x}'
+
+
+def test_index_to_bitmask_round_trip():
+    indices = button_masks_to_indices(INDEX_TO_BITMASK)
+    np.testing.assert_array_equal(indices, np.arange(N_ACTIONS))
+
+
+def test_unmapped_bits_are_ignored():
+    # Bits Slippi reports that are not part of the controller state
+    extra = int(Buttons.Logical.START)
+    assert extra not in {int(b) for b in STATE_TO_SLIPPI}
+
+    indices = button_masks_to_indices(INDEX_TO_BITMASK | extra)
+    np.testing.assert_array_equal(indices, np.arange(N_ACTIONS))
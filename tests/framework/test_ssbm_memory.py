@@ -0,0 +1,68 @@
+import struct
+
+import numpy as np
+
+from framework.devices.dolphin.dolphin import MemoryFrame
+from framework.games.ssbm.ssbm_memory import (LOCATIONS_FILE, SCHEMA,
+                                              MemoryDecoder)
+from framework.games.ssbm.ssbm_observation import FIELDS
+from framework.state_builders import SSBMDolphinBuilder
+
+
+def _raw_values(values: dict) -> bytes:
+    """Pack raw 32-bit words per field name, floats as IEEE 754."""
+    words = []
+    for field in SCHEMA:
+        value = values.get(field.name, 0)
+        words.append(struct.pack('>f' if isinstance(value, float) else '>I',
+                                 value))
+    return b''.join(words)
+
+
+def test_locations_file_matches_schema():
+    # Regenerate with python -m framework.games.ssbm.ssbm_memory if this fails
+    locations = LOCATIONS_FILE.read_text()
+    assert locations == MemoryDecoder().locations()
+    assert tuple(locations.splitlines()) == \
+        tuple(field.address for field in SCHEMA)
+
+
+def test_decode():
+    decoder = MemoryDecoder()
+    integers = np.zeros(len(SCHEMA), dtype=np.uint32)
+    decoded = decoder.decode(_raw_values(dict(
+        player_stocks=3 << 24 | 0xABCDEF,
+        enemy_percent=57 << 16 | 0x1234,
+        menu_state=0xFFF2FFFF,
+        player_x=-12.5,
+        frame=(1 << 24) + 1,
+    )), integers_out=integers)
+
+    frame = decoded.view(decoder.dtype)[0]
+    assert frame['player_stocks'] == 3
+    assert frame['enemy_percent'] == 57
+    assert frame['menu_state'] == 0x0F & (0xFFF2FFFF >> 20)
+    assert frame['player_x'] == -12.5
+    # float32 cannot hold the frame counter above 2^24, the integers can
+    assert integers.view(decoder.integer_dtype)[0]['frame'] == (1 << 24) + 1
+    assert integers[decoder.index('menu_state')] == 0x0F
+
+
+def test_builder_observation_and_meta_update():
+    decoder = MemoryDecoder()
+    builder = SSBMDolphinBuilder(decoder)
+    values = _raw_values(dict(player_stocks=4 << 24, enemy_stocks=2 << 24,
+                              player_y=3.0, menu_state=12 << 20, frame=99))
+
+    meta_update, observation = builder.transform(
+        MemoryFrame(decoder.addresses, values, (decoder.index('frame'),)))
+    assert meta_update is None
+    assert builder.frame == 99
+    assert observation.player_stocks == 4
+    assert observation.enemy_stocks == 2
+    assert observation.as_array()[FIELDS.index('player_y')] == 3.0
+
+    meta_update, _ = builder.transform(
+        MemoryFrame(decoder.addresses, values,
+                    (decoder.index('menu_state'),)))
+    assert meta_update == 12
@@ -0,0 +1,36 @@
+import numpy as np
+
+from framework.games.ssbm.ssbm_observation import FIELDS, SSBMObservation
+from framework.games.ssbm.ssbm_reward import SimpleSSBMReward
+
+
+def _game(n_frames: int) -> np.ndarray:
+    """Observations with stocks and percents changing like in a game."""
+    rng = np.random.RandomState(0)
+    observations = rng.rand(n_frames, SSBMObservation.size()) * 100
+    for name in ('player_stocks', 'enemy_stocks'):
+        observations[:, FIELDS.index(name)] = \
+            4 - np.sort(rng.randint(0, 4, n_frames))
+    for name in ('player_percent', 'enemy_percent'):
+        observations[:, FIELDS.index(name)] = rng.randint(0, 200, n_frames)
+    return observations.astype(np.float32)
+
+
+def test_batch_cost_matches_cost():
+    reward = SimpleSSBMReward()
+    observations = _game(50)
+
+    expected = [0.0] + [
+        reward.cost(SSBMObservation.from_array(observations[t]),
+                    [SSBMObservation.from_array(observations[t - 1])], t)
+        for t in range(1, len(observations))]
+
+    costs = reward.batch_cost(observations)
+    assert costs.dtype == np.float32
+    np.testing.assert_allclose(costs, expected, rtol=1e-6, atol=1e-3)
+
+
+def test_batch_cost_short_trajectories():
+    reward = SimpleSSBMReward()
+    np.testing.assert_array_equal(reward.batch_cost(_game(1)), [0.0])
+    assert len(reward.batch_cost(_game(0))) == 0
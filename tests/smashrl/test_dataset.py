@@ -0,0 +1,65 @@
+import struct
+
+import pytest
+from slippi.event import EventType
+from slippi.id import CSSCharacter, Stage
+
+from smashrl.dataset import (RAW_HEADER, REJECTED_STAGE, read_game_start,
+                             validate_start)
+
+HUMAN, CPU, EMPTY = 0, 1, 3
+
+
+def _game_start(stage: Stage, players) -> bytes:
+    """Game start payload laid out like py-slippi's Start._parse reads it."""
+    payload = bytes([1, 0, 0, 0]) + bytes(8) + b'\x00' + bytes(5) + \
+        struct.pack('>H', stage) + bytes(80)
+    for character, player_type in players:
+        payload += bytes([character, player_type, 4, 0]) + bytes(5) + \
+            b'\x00' + bytes(26)
+    return payload + bytes(72) + struct.pack('>L', 0)
+
+
+def _replay(stage: Stage = Stage.BATTLEFIELD, players=(
+        (CSSCharacter.FOX, HUMAN), (CSSCharacter.FALCO, CPU),
+        (0, EMPTY), (0, EMPTY))) -> bytes:
+    game_start = _game_start(stage, players)
+    sizes = struct.pack('>BH', EventType.GAME_START, len(game_start)) + \
+        struct.pack('>BH', EventType.FRAME_PRE, 63)
+    return RAW_HEADER + struct.pack('>l', 0) + \
+        bytes([EventType.EVENT_PAYLOADS, len(sizes) + 1]) + sizes + \
+        bytes([EventType.GAME_START]) + game_start
+
+
+def test_read_game_start(tmp_path):
+    path = tmp_path / 'game.slp'
+    path.write_bytes(_replay() + b'frames are never read')
+
+    start = read_game_start(str(path))
+    assert start.stage == Stage.BATTLEFIELD
+    assert [p.character if p else None for p in start.players] == \
+        [CSSCharacter.FOX, CSSCharacter.FALCO, None, None]
+    assert validate_start(start) == ''
+
+
+def test_validate_start_rejects_stage(tmp_path):
+    path = tmp_path / 'game.slp'
+    path.write_bytes(_replay(stage=Stage.DREAM_LAND_N64))
+    assert validate_start(read_game_start(str(path))) == REJECTED_STAGE
+
+
+@pytest.mark.parametrize('data', [b'', b'not a replay at all'])
+def test_read_game_start_rejects_other_files(tmp_path, data):
+    path = tmp_path / 'game.slp'
+    path.write_bytes(data)
+    with pytest.raises(ValueError):
+        read_game_start(str(path))
+
+
+def test_truncated_replays_raise_value_error(tmp_path):
+    replay = _replay()
+    path = tmp_path / 'game.slp'
+    for length in range(len(replay)):
+        path.write_bytes(replay[:length])
+        with pytest.raises(ValueError):
+            read_game_start(str(path))
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from framework.games.ssbm.ssbm_observation import SSBMObservation
+from smashrl.shards import (INDEX_FILE, ShardDataset, ShardWriter,
+                            is_shard_dataset)
+
+
+def _trajectory(n_frames: int, seed: int):
+    rng = np.random.RandomState(seed)
+    done = np.zeros(n_frames, dtype=np.uint8)
+    done[-1:] = 1
+    return (rng.rand(n_frames, SSBMObservation.size()).astype(np.float32),
+            rng.randint(-1, 100, n_frames).astype(np.int16),
+            rng.randn(n_frames).astype(np.float32),
+            done)
+
+
+def test_round_trip(tmp_path):
+    trajectories = [_trajectory(n, seed) for seed, n in
+                    enumerate((6, 3, 5, 1))]
+    with ShardWriter(str(tmp_path), frames_per_shard=10) as writer:
+        for i, trajectory in enumerate(trajectories):
+            writer.append(trajectory, source=f'game-{i}.slp')
+        writer.append(_trajectory(0, 99))  # Empty trajectories are skipped
+
+    assert is_shard_dataset(str(tmp_path))
+    dataset = ShardDataset(str(tmp_path))
+    assert len(dataset) == len(trajectories)
+    assert dataset.n_frames == 15
+    # 6 + 3 frames fit, the 5 frame trajectory spills into a new shard
+    assert [t['shard'] for t in dataset.trajectories] == [0, 0, 1, 1]
+    assert [t['source'] for t in dataset.trajectories] == \
+        [f'game-{i}.slp' for i in range(4)]
+
+    for expected, actual in zip(trajectories, dataset):
+        for expected_column, actual_column in zip(expected, actual):
+            assert actual_column.dtype == expected_column.dtype
+            np.testing.assert_array_equal(actual_column, expected_column)
+
+
+def test_trajectory_larger_than_shard(tmp_path):
+    with ShardWriter(str(tmp_path), frames_per_shard=4) as writer:
+        writer.append(_trajectory(2, 0))
+        writer.append(_trajectory(9, 1))
+
+    dataset = ShardDataset(str(tmp_path))
+    # Trajectories are never split, an oversized one gets its own shard
+    assert [t['shard'] for t in dataset.trajectories] == [0, 1]
+    np.testing.assert_array_equal(dataset[1][0], _trajectory(9, 1)[0])
+
+
+def test_interrupted_run_has_no_index(tmp_path):
+    with ShardWriter(str(tmp_path), frames_per_shard=10) as writer:
+        writer.append(_trajectory(5, 0))
+    assert is_shard_dataset(str(tmp_path))
+
+    # A failed rerun removes the stale index and does not write a new one
+    with pytest.raises(RuntimeError):
+        with ShardWriter(str(tmp_path), frames_per_shard=10) as writer:
+            writer.append(_trajectory(5, 1))
+            raise RuntimeError('decoding failed')
+
+    assert not (tmp_path / INDEX_FILE).exists()
+    assert not is_shard_dataset(str(tmp_path))
+    assert writer.files is None
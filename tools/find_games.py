@@ -4,8 +4,8 @@ import logging
 import os
 from multiprocessing import Pool
 
-from slippi import Game
 from slippi.id import CSSCharacter, Stage
+from smashrl.dataset import read_game_start
 
 STAGES = [Stage.BATTLEFIELD, Stage.FINAL_DESTINATION]
 CHARACTERS = [CSSCharacter.FOX]
@@ -16,11 +16,11 @@ log = logging.getLogger(__name__)
 def is_valid(f):
     try:
         log.info(f"Scanning {f}")
-        game = Game(os.path.join('./data', f))
-        all_characters = [p.character for p in game.start.players
+        start = read_game_start(os.path.join('./data', f))
+        all_characters = [p.character for p in start.players
                           if p is not None]
 
-        if game.start.stage in STAGES and \
+        if start.stage in STAGES and \
                 len(set(all_characters) & set(CHARACTERS)) > 0:
             return True
         return False
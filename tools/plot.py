@@ -1,25 +1,51 @@
-
+import argparse
 import logging
+from collections import defaultdict
 
 import matplotlib.pyplot as plt
-import pandas as pd
-from watchgod import AllWatcher, run_process
+
+from framework.games.game import GameStatsReader
 
 log = logging.getLogger(__name__)
 
+PLOTTED_STATS = ('total_reward', 'total_timesteps', 'mean_loss', 'epsilon')
+
+
+def _main(stats_file: str, interval: float):
+    reader = GameStatsReader(stats_file)
+    series = defaultdict(list)
+
+    plt.ion()
+    fig, axes = plt.subplots(len(PLOTTED_STATS), 1, sharex=True)
 
-def _main():
-    watcher = AllWatcher('/Users/johan/Dev/smash-rl')
-    run_process(path='stats.json', target=plot_stuff, watcher_cls=watcher)
+    # Tail the log, only the games written since the last poll are parsed
+    while plt.fignum_exists(fig.number):
+        records = reader.read_new()
+        if records:
+            for record in records:
+                for name in PLOTTED_STATS:
+                    series[name].append(record.get(name))
+            log.info(f'Plotting {len(series["total_reward"])} games')
+            plot_stuff(axes, series)
+        plt.pause(interval)
 
 
-def plot_stuff():
-    df = pd.read_json('stats.json')
-    log.info(df)
-    plt.close()
-    plt.plot(df)
-    plt.show()
+def plot_stuff(axes, series):
+    for ax, name in zip(axes, PLOTTED_STATS):
+        values = [float('nan') if v is None else v for v in series[name]]
+        ax.clear()
+        ax.plot(values)
+        ax.set_ylabel(name)
+    axes[-1].set_xlabel('game')
 
 
 if __name__ == "__main__":
-    _main()
+    parser = argparse.ArgumentParser(
+        description='Plot game statistics while they are being written.')
+    parser.add_argument('stats_file', nargs='?', default='stats.jsonl',
+                        help='GameStats log to follow')
+    parser.add_argument('--interval', type=float, default=5.0,
+                        help='Seconds between checks for new games')
+
+    args = parser.parse_args()
+    _main(args.stats_file, args.interval)